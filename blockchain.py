@@ -1,20 +1,58 @@
 import hashlib
 import json
+import sys
+import threading
 import time
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+from mempool import DuplicateTransactionError, Mempool
+from miner import MAX_TARGET, bits_for_target, mine, target_bytes, target_for_bits
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def _intern(value: str) -> str:
+    # Senders, recipients, categories and statuses repeat across millions of
+    # transactions; interning keeps a single copy of each string.
+    return sys.intern(value) if type(value) is str else value
+
+
+_last_id = 0
+_id_lock = threading.Lock()
+
+
+def _new_id() -> int:
+    # Millisecond timestamp, bumped past the last id handed out so that
+    # transactions created in the same millisecond still get distinct ids.
+    global _last_id
+    with _id_lock:
+        _last_id = max(_last_id + 1, int(time.time() * 1000))
+        return _last_id
 
 
 class Transaction:
-    def __init__(self, sender: str, recipient: str, amount: float, id: int = None, ratings: float = None, description: str = "", status: str = "pending", category: str = ""): 
-        self.sender = sender
-        self.recipient = recipient
+    __slots__ = ("sender", "recipient", "amount", "id", "timestamp", "ratings", "description", "status", "category")
+
+    def __init__(self, sender: str, recipient: str, amount: float, id: int = None, ratings: float = None, description: str = "", status: str = "pending", category: str = "", timestamp: float = None):
+        self.sender = _intern(sender)
+        self.recipient = _intern(recipient)
         self.amount = float(amount)
-        self.id = id if id is not None else int(time.time() * 1000)  # unique-ish id
-        self.timestamp = time.time()
-        self.ratings = ratings if ratings is not None else 0.0
+        self.id = id if id is not None else _new_id()
+        self.timestamp = float(timestamp) if timestamp is not None else time.time()
+        self.ratings = float(ratings) if ratings is not None else 0.0
         self.description = description
-        self.status = status
-        self.category = category
+        self.status = _intern(status)
+        self.category = _intern(category)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Transaction":
+        return cls(data["sender"], data["recipient"], data["amount"], id=data.get("id"), ratings=data.get("ratings"), description=data.get("description", ""), status=data.get("status", "pending"), category=data.get("category", ""), timestamp=data.get("timestamp"))
 
     def to_dict(self) -> Dict[str, str]:
         return {
@@ -30,84 +68,786 @@ class Transaction:
         }
 
 
+class TransactionTable:
+    """Columnar, read-only transaction store backed by a NumPy structured array.
+
+    Numeric fields are stored natively. Sender, recipient, status and category
+    repeat across transactions and are stored as uint32 codes into the table's
+    own string pool, so a row takes 48 bytes. Descriptions are free text and
+    are kept as plain strings alongside the rows, outside the pool.
+    Iterating or indexing materializes `Transaction` objects on demand.
+    """
+
+    __slots__ = ("_rows", "_strings", "_descriptions")
+
+    _POOLED_FIELDS = ("sender", "recipient", "status", "category")
+    DTYPE = [("id", "i8"), ("timestamp", "f8"), ("amount", "f8"), ("ratings", "f8")] + [(name, "u4") for name in _POOLED_FIELDS]
+
+    def __init__(self, rows, strings: List[str], descriptions: Sequence[str]):
+        self._rows = rows
+        self._strings = strings
+        self._descriptions = descriptions
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Transaction]) -> Optional["TransactionTable"]:
+        """Build a table, or return None if some field cannot be stored in columns."""
+        if not NUMPY_AVAILABLE:
+            return None
+        if any(type(t.id) is not int or type(t.description) is not str or type(getattr(t, name)) is not str for t in transactions for name in cls._POOLED_FIELDS):
+            return None
+        # The pool is only written here, before the table is shared, so it
+        # needs no lock and only holds strings this table uses.
+        strings: List[str] = []
+        codes: Dict[str, int] = {}
+
+        def code(value: str) -> int:
+            index = codes.get(value)
+            if index is None:
+                index = codes[value] = len(strings)
+                strings.append(value)
+            return index
+
+        try:
+            rows = np.array(
+                [(t.id, t.timestamp, t.amount, t.ratings) + tuple(code(getattr(t, name)) for name in cls._POOLED_FIELDS)
+                 for t in transactions],
+                dtype=cls.DTYPE,
+            )
+        except (TypeError, ValueError, OverflowError):
+            return None
+        rows.flags.writeable = False
+        return cls(rows, strings, tuple(t.description for t in transactions))
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _materialize(self, row: tuple, description: str) -> Transaction:
+        strings = self._strings
+        id, timestamp, amount, ratings, sender, recipient, status, category = row
+        return Transaction(strings[sender], strings[recipient], amount, id=id, ratings=ratings, description=description, status=strings[status], category=strings[category], timestamp=timestamp)
+
+    def __getitem__(self, position: int) -> Transaction:
+        return self._materialize(self._rows[position].tolist(), self._descriptions[position])
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for row, description in zip(self._rows.tolist(), self._descriptions):
+            yield self._materialize(row, description)
+
+    def to_dicts(self) -> List[Dict]:
+        strings = self._strings
+        return [
+            {
+                "id": id,
+                "timestamp": timestamp,
+                "sender": strings[sender],
+                "recipient": strings[recipient],
+                "amount": amount,
+                "ratings": ratings,
+                "description": description,
+                "status": strings[status],
+                "category": strings[category],
+            }
+            for (id, timestamp, amount, ratings, sender, recipient, status, category), description in zip(self._rows.tolist(), self._descriptions)
+        ]
+
+
+def merkle_root(transactions: Sequence[Union[Dict, Transaction]]) -> str:
+    """Merkle root (hex) of the transactions; the empty list hashes to sha256(b"")."""
+    if not len(transactions):
+        return hashlib.sha256(b"").hexdigest()
+    level = [hashlib.sha256(json.dumps(tx if isinstance(tx, dict) else tx.to_dict(), sort_keys=True).encode()).digest() for tx in transactions]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
 class Block:
-    def __init__(self, index: int, timestamp: float, transactions: List[Dict], proof: int, previous_hash: str, block_id: int = None, block_ratings: float = None, miner: str = "", notes: str = ""):
+    __slots__ = ("index", "timestamp", "transactions", "proof", "previous_hash", "block_id", "block_ratings", "miner", "notes", "target", "merkle_root", "hash", "_sealed")
+
+    def __init__(self, index: int, timestamp: float, transactions: Sequence[Union[Dict, Transaction]], proof: int, previous_hash: str, block_id: int = None, block_ratings: float = None, miner: str = "", notes: str = "", target: Optional[str] = None, columnar: bool = False):
         self.index = index
         self.timestamp = timestamp
-        self.transactions = transactions
+        # Transactions are kept as Transaction records (or a TransactionTable
+        # when `columnar`) and only turned into dicts when serialized.
+        if isinstance(transactions, TransactionTable):
+            records = transactions
+        else:
+            records = tuple(tx if isinstance(tx, Transaction) else Transaction.from_dict(tx) for tx in transactions)
+        self.transactions = (columnar and not isinstance(records, TransactionTable) and TransactionTable.from_transactions(records)) or records
         self.proof = proof
         self.previous_hash = previous_hash
         self.block_id = block_id if block_id is not None else int(time.time() * 1000)
         self.block_ratings = block_ratings if block_ratings is not None else 0.0
         self.miner = miner
         self.notes = notes
+        # Hex proof-of-work target this block's proof was mined against
+        # (None when the chain uses a plain hex-prefix difficulty).
+        self.target = target
+        # Seal the block: the header commits to the transactions through their
+        # Merkle root and the hash is computed exactly once.
+        self.merkle_root = merkle_root(records)
+        self.hash = self.compute_hash()
+        self._sealed = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_sealed", False):
+            raise AttributeError(f"Block {self.index} is sealed; cannot set {name!r}")
+        super().__setattr__(name, value)
 
     def to_dict(self) -> Dict:
         return {
             "block_id": self.block_id,
             "index": self.index,
             "timestamp": self.timestamp,
-            "transactions": self.transactions,
+            "transactions": self.transactions.to_dicts() if isinstance(self.transactions, TransactionTable) else [t.to_dict() for t in self.transactions],
+            "merkle_root": self.merkle_root,
             "proof": self.proof,
             "previous_hash": self.previous_hash,
-            "hash": self.hash_block(),
+            "target": self.target,
+            "hash": self.hash,
             "block_ratings": self.block_ratings,
             "miner": self.miner,
             "notes": self.notes,
         }
 
-    def hash_block(self) -> str:
+    def compute_hash(self) -> str:
         block_string = json.dumps({
             "index": self.index,
             "timestamp": self.timestamp,
-            "transactions": self.transactions,
+            "merkle_root": self.merkle_root,
             "proof": self.proof,
             "previous_hash": self.previous_hash,
+            "target": self.target,
         }, sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
 
+    def hash_block(self) -> str:
+        return self.hash
+
+    @classmethod
+    def from_dict(cls, data: Dict, columnar: bool = False) -> "Block":
+        """Rebuild a sealed block from `to_dict` output.
+
+        The stored Merkle root and hash are recomputed from the contents, so a
+        block whose data does not match its recorded hash is rejected.
+        """
+        block = cls(data["index"], data["timestamp"], data["transactions"], data["proof"], data["previous_hash"], block_id=data.get("block_id"), block_ratings=data.get("block_ratings"), miner=data.get("miner", ""), notes=data.get("notes", ""), target=data.get("target"), columnar=columnar)
+        if data.get("hash") not in (None, block.hash):
+            raise ValueError(f"Block {block.index} does not match its recorded hash")
+        return block
+
+
+class StoredChain:
+    """List-like view of the blocks in a ChainStore.
+
+    Blocks are decoded from the store on access and the most recently used
+    ones are kept in memory; nothing is loaded up front.
+    """
+
+    def __init__(self, store, columnar: bool = False, cache_size: int = 1024):
+        self.store = store
+        self.columnar = columnar
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Block]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def _load(self, position: int) -> Block:
+        block = self._cache.get(position)
+        if block is None:
+            block = Block.from_dict(self.store.read(position), columnar=self.columnar)
+            self._cache[position] = block
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(position)
+        return block
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._load(i) for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("chain index out of range")
+        return self._load(position)
+
+    def __iter__(self) -> Iterator[Block]:
+        for position in range(len(self)):
+            yield self._load(position)
+
+    def append(self, block: Block):
+        position = self.store.append(block.to_dict())
+        self._cache[position] = block
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+# Blocks are validated in chunks of this many consecutive blocks per task.
+DEFAULT_VALIDATION_CHUNK = 2000
+
+
+def _block_record(record: Union[bytes, Dict]) -> Dict:
+    return json.loads(record) if isinstance(record, (bytes, bytearray, memoryview)) else record
+
+
+def initial_target(difficulty_prefix: str = "0000", difficulty_bits: Optional[float] = None) -> Optional[int]:
+    """Starting proof-of-work target for a difficulty, or None for a non-zero hex prefix.
+
+    A prefix of hex zeros maps to 4 bits per digit; any other prefix keeps the
+    old hex-string check and disables retargeting.
+    """
+    if difficulty_bits is not None:
+        return target_for_bits(difficulty_bits)
+    if not difficulty_prefix.strip("0"):
+        return target_for_bits(4 * len(difficulty_prefix))
+    return None
+
+
+def next_target(target: int, elapsed: float, target_block_time: float, retarget_interval: int, max_retarget_factor: float) -> int:
+    """Target after a retarget window of `retarget_interval` blocks that took `elapsed` seconds"""
+    expected = retarget_interval * target_block_time
+    factor = min(max(max(elapsed, 1e-6) / expected, 1 / max_retarget_factor), max_retarget_factor)
+    return min(max(int(target * factor), 1), MAX_TARGET)
+
+
+def _timestamp(record) -> float:
+    return record.timestamp if isinstance(record, Block) else _block_record(record)["timestamp"]
+
+
+def target_schedule(blocks: Sequence, start_target: Optional[int], target_block_time: Optional[float] = None, retarget_interval: int = 10, max_retarget_factor: float = 4.0) -> List[Optional[int]]:
+    """Expected proof-of-work target of each retarget window of a chain.
+
+    The block at position p must meet entry max(p - 1, 0) // retarget_interval;
+    the last entry is the target for the next block. The schedule follows
+    from the starting target and the timestamps of the blocks on window
+    boundaries alone, never from the targets blocks declare.
+    """
+    schedule = [start_target]
+    if start_target is None or not target_block_time:
+        return schedule
+    length = len(blocks)
+    previous = _timestamp(blocks[0]) if length else None
+    for position in range(retarget_interval, length, retarget_interval):
+        timestamp = _timestamp(blocks[position])
+        schedule.append(next_target(schedule[-1], timestamp - previous, target_block_time, retarget_interval, max_retarget_factor))
+        previous = timestamp
+    return schedule
+
+
+def _window(position: int, retarget_interval: Optional[int]) -> int:
+    # Retarget window of a block position; a schedule without retargeting
+    # (retarget_interval None) has the single window 0
+    return max(position - 1, 0) // retarget_interval if retarget_interval else 0
+
+
+def _check_blocks(start: int, records: List, previous: Optional[Dict], difficulty_prefix: str, targets: Optional[tuple] = None, retarget_interval: Optional[int] = None) -> List[str]:
+    """Check blocks start..start+len(records)-1 against the block before them.
+
+    Each block is rebuilt from its record, which recomputes its Merkle root and
+    hash; the link to the previous block and the proof are checked against the
+    previous block's stored proof and hash. The genesis block has no proof.
+    `targets` is (first window, expected targets from that window on), cut
+    from `target_schedule`, and `retarget_interval` is None when that schedule
+    has a single entry: a block may declare a harder target than expected
+    but never an easier one. Without expected targets the proof is checked
+    against `difficulty_prefix`.
+    """
+    first_window, expected_targets = targets if targets is not None else (0, [None])
+    errors = []
+    for offset, record in enumerate(records):
+        position = start + offset
+        data = _block_record(record)
+        try:
+            block = Block.from_dict(data)
+            declared = int(block.target, 16) if block.target is not None else None
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append(f"block {position + 1}: {e}")
+            previous = data
+            continue
+        if block.index != position + 1:
+            errors.append(f"block {position + 1}: recorded index {block.index}")
+        expected = expected_targets[_window(position, retarget_interval) - first_window]
+        if expected is not None and (declared is None or declared > expected):
+            errors.append(f"block {block.index}: target is easier than the expected {expected:064x}")
+            declared = expected
+        if previous is not None:
+            if block.previous_hash != previous.get("hash"):
+                errors.append(f"block {block.index}: previous_hash does not match block {block.index - 1}")
+            guess = f"{previous.get('proof')}{block.proof}{previous.get('hash')}".encode()
+            if expected is not None:
+                valid = hashlib.sha256(guess).digest() < target_bytes(declared)
+            else:
+                valid = hashlib.sha256(guess).hexdigest().startswith(difficulty_prefix)
+            if not valid:
+                errors.append(f"block {block.index}: proof does not meet its target")
+        previous = data
+    return errors
+
+
+class _BlockRecords:
+    """Sequence of block dicts over in-memory blocks, converted on access"""
+
+    def __init__(self, chain: List[Block]):
+        self.chain = chain
+
+    def __len__(self) -> int:
+        return len(self.chain)
+
+    def __getitem__(self, position: int) -> Dict:
+        return self.chain[position].to_dict()
+
+
+def validate_chain(blocks: Sequence, difficulty_prefix: str = "0000", checkpoints: Optional[Dict[int, str]] = None, workers: Optional[int] = None, chunk_size: int = DEFAULT_VALIDATION_CHUNK, max_errors: int = 100, start_target: Optional[int] = None, target_block_time: Optional[float] = None, retarget_interval: int = 10, max_retarget_factor: float = 4.0) -> Dict:
+    """Validate a chain given as a sequence of block dicts or their JSON bytes.
+
+    Each block must meet the target the chain's own difficulty schedule
+    expects (see `target_schedule`), starting from `start_target` or else the
+    target of `difficulty_prefix`; the targets blocks declare are only
+    trusted when they are at least that hard.
+
+    Every check needs only a block and the stored proof and hash of the block
+    before it, so chunks of blocks are verified independently across
+    `workers` processes (in-process when workers is None or 1). `checkpoints` maps
+    block index to a trusted hash: the chain is only re-verified after the
+    highest checkpoint it matches, and a checkpoint it contradicts makes it
+    invalid outright.
+
+    Returns:
+        Dictionary with valid, errors, checked and skipped block counts, the
+        checkpoint used, elapsed seconds, blocks_per_sec and workers
+    """
+    started = time.perf_counter()
+    length = len(blocks)
+    errors: List[str] = []
+    trusted = 0
+    for index in sorted(checkpoints or {}, reverse=True):
+        if index > length:
+            continue
+        if _block_record(blocks[index - 1]).get("hash") != checkpoints[index]:
+            errors.append(f"block {index}: does not match checkpoint {checkpoints[index]}")
+        elif not trusted:
+            trusted = index
+
+    if start_target is None:
+        start_target = initial_target(difficulty_prefix)
+    schedule = target_schedule(blocks, start_target, target_block_time, retarget_interval, max_retarget_factor) if not errors else [start_target]
+    interval = retarget_interval if len(schedule) > 1 else None
+
+    def chunks():
+        for start in range(trusted, length, chunk_size):
+            stop = min(start + chunk_size, length)
+            previous = _block_record(blocks[start - 1]) if start else None
+            # Each task only gets the slice of the schedule its blocks fall in
+            first, last = _window(start, interval), _window(stop - 1, interval)
+            yield start, [blocks[p] for p in range(start, stop)], previous, difficulty_prefix, (first, schedule[first:last + 1]), interval
+
+    workers = workers or 1
+    if errors:
+        trusted = length
+    elif workers == 1:
+        for args in chunks():
+            errors.extend(_check_blocks(*args))
+            if len(errors) >= max_errors:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded number of chunks in flight so memory stays flat
+            pending = []
+            for args in chunks():
+                pending.append(pool.submit(_check_blocks, *args))
+                if len(pending) >= 2 * workers:
+                    errors.extend(pending.pop(0).result())
+                if len(errors) >= max_errors:
+                    break
+            for future in pending:
+                errors.extend(future.result())
+
+    elapsed = time.perf_counter() - started
+    checked = length - trusted
+    return {
+        "valid": not errors,
+        "errors": errors[:max_errors],
+        "length": length,
+        "checked": checked,
+        "skipped": trusted,
+        "checkpoint": trusted or None,
+        "elapsed": elapsed,
+        "blocks_per_sec": checked / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
+
 
 class Blockchain:
-    def __init__(self, difficulty_prefix: str = "0000"):
-        self.current_transactions: List[Transaction] = []
-        self.chain: List[Block] = []
+    def __init__(self, difficulty_prefix: str = "0000", difficulty_bits: Optional[float] = None, target_block_time: Optional[float] = None, retarget_interval: int = 10, max_retarget_factor: float = 4.0, columnar: bool = False, store=None, max_block_size: Optional[int] = None, genesis: Optional[Block] = None):
+        # Pending transactions; a block takes at most `max_block_size` of them
+        # (None takes them all).
+        self.mempool = Mempool()
+        self.max_block_size = max_block_size
+        # Store each block's transactions in a NumPy structured array.
+        self.columnar = columnar
+        # With a ChainStore the chain lives on disk and is read back lazily.
+        self.store = store
+        self.chain: Union[List[Block], StoredChain] = StoredChain(store, columnar) if store is not None else []
+        # Serialized JSON of each in-memory block, filled on first request;
+        # blocks are immutable so the bytes never go stale.
+        self._block_json: List[bytes] = []
+        # Secondary indexes over confirmed transactions. Postings are
+        # (block position, transaction position) pairs; blocks are indexed up
+        # to `_indexed_upto`, incrementally as they are added and lazily for
+        # blocks loaded from a store.
+        self._indexed_upto = 0
+        self._tx_by_id: Dict = {}
+        self._by_sender: Dict[str, List[tuple]] = {}
+        self._by_recipient: Dict[str, List[tuple]] = {}
+        self._by_category: Dict[str, List[tuple]] = {}
+        self._balances: Dict[str, float] = {}
+        # Ids of transactions in blocks added while the indexes lag behind
+        # (a store-backed chain is not indexed on open), kept so duplicate
+        # checks cover them without indexing the whole store.
+        self._unindexed_ids: set = set()
         self.difficulty_prefix = difficulty_prefix
-        # Create genesis block
-        self.new_block(proof=100, previous_hash="1")
+        # Proof-of-work target as a 256-bit integer: a proof is valid when its
+        # guess hash is below it (None for a non-zero hex prefix; see initial_target).
+        self.target: Optional[int] = initial_target(difficulty_prefix, difficulty_bits)
+        # Every `retarget_interval` blocks the target is scaled towards
+        # `target_block_time` seconds per block, by at most `max_retarget_factor`.
+        self.target_block_time = target_block_time
+        self.retarget_interval = retarget_interval
+        self.max_retarget_factor = max_retarget_factor
+        self.last_mining_stats: Optional[Dict] = None
+        # Trusted block hashes by block index; validation starts after the last one.
+        self.checkpoints: Dict[int, str] = {}
+        # Target of the first window; validation expects every later target
+        # from it and the block timestamps
+        self.start_target = self.target
+        if self.chain:
+            self.target = self._resume_target()
+        elif genesis is not None:
+            # Nodes of one network share a genesis block
+            self.chain.append(genesis)
+            self._index_block(0, genesis)
+            if genesis.target is not None and self.target is not None:
+                self.target = self.start_target = int(genesis.target, 16)
+        else:
+            # Create genesis block
+            self.new_block(proof=100, previous_hash="1")
+
+    def _resume_target(self) -> Optional[int]:
+        """Target for the next block of a stored chain, read from its last retarget window.
+
+        Without retargeting the target never changes. Otherwise only the
+        blocks of the last window are read, straight from their stored
+        records: the store only holds blocks that met the expected target,
+        and blocks mined here declare exactly that target, so the easiest
+        target declared in the window is the window's target. If the last
+        block closed a window, it is rescaled as `retarget` would.
+        """
+        if self.target is None or not self.target_block_time:
+            return self.target
+        interval = self.retarget_interval
+        last = len(self.chain) - 1
+        window = _window(last, interval)
+        records = [_block_record(self.store.read_raw(position)) for position in range(window * interval + 1 if window else 0, last + 1)]
+        declared = [int(record["target"], 16) for record in records if record.get("target") is not None]
+        target = max(declared) if declared else self.start_target
+        if last >= interval and last % interval == 0:
+            first = _block_record(self.store.read_raw(last - interval))
+            target = next_target(target, records[-1]["timestamp"] - first["timestamp"], self.target_block_time, interval, self.max_retarget_factor)
+        return target
 
     def new_block(self, proof: int, previous_hash: Optional[str] = None, miner: str = "", notes: str = "") -> Block:
         block = Block(
             index=len(self.chain) + 1,
             timestamp=time.time(),
-            transactions=[t.to_dict() for t in self.current_transactions],
+            transactions=self.mempool.take(self.max_block_size),
             proof=proof,
-            previous_hash=previous_hash or (self.chain[-1].hash_block() if self.chain else "1"),
+            previous_hash=previous_hash or (self.chain[-1].hash if self.chain else "1"),
             miner=miner,
-            notes=notes
+            notes=notes,
+            target=f"{self.target:064x}" if self.target is not None else None,
+            columnar=self.columnar,
         )
-        self.current_transactions = []
         self.chain.append(block)
+        self._index_new_block(block)
+        self.retarget()
         return block
 
+    def append_block(self, block: Block) -> Block:
+        """Append a block sealed elsewhere (e.g. received from a peer) to the tip.
+
+        The block must extend the current last block, declare a target no
+        easier than the one this chain expects next and meet it. Its
+        transactions leave the mempool; the chain keeps its own target
+        schedule whatever the block declares.
+        """
+        last = self.last_block
+        if block.previous_hash != last.hash or block.index != last.index + 1:
+            raise ValueError(f"Block {block.index} does not extend block {last.index}")
+        if not self.valid_proof(last.proof, block.proof, last.hash, self._block_target(block, self.target)):
+            raise ValueError(f"Block {block.index} has an invalid proof")
+        self.chain.append(block)
+        for tx in block.transactions:
+            self.mempool.remove(tx.id)
+        self._index_new_block(block)
+        self.retarget()
+        return block
+
+    @staticmethod
+    def _block_target(block: Block, expected: Optional[int]) -> Optional[int]:
+        # The declared target may be harder than expected but never easier
+        if expected is None:
+            return None
+        declared = int(block.target, 16) if block.target is not None else None
+        if declared is None or declared > expected:
+            raise ValueError(f"Block {block.index} declares a target easier than the expected {expected:064x}")
+        return declared
+
+    def reorganize(self, fork_position: int, blocks: Sequence[Block]) -> List[Block]:
+        """Replace the blocks after `fork_position` with `blocks` and return the orphaned ones.
+
+        `blocks` must link up from chain[fork_position - 1] and meet the
+        targets the chain's schedule expects for them. Transactions from
+        orphaned blocks that the new branch does not include go back to the
+        mempool. Store-backed chains are append-only and cannot be reorganized,
+        and no reorganization may cross a checkpoint.
+        """
+        if self.store is not None:
+            raise ValueError("A store-backed chain cannot be reorganized")
+        if not 0 < fork_position <= len(self.chain):
+            raise ValueError(f"Fork position {fork_position} is outside the chain")
+        if any(index > fork_position for index in self.checkpoints):
+            raise ValueError(f"Reorganization at {fork_position} would cross a checkpoint")
+        previous = self.chain[fork_position - 1]
+        schedule = target_schedule(self.chain[:fork_position] + list(blocks), self.start_target, self.target_block_time, self.retarget_interval, self.max_retarget_factor)
+        for position, block in enumerate(blocks, fork_position):
+            if block.previous_hash != previous.hash or block.index != previous.index + 1:
+                raise ValueError(f"Block {block.index} does not extend block {previous.index}")
+            target = self._block_target(block, schedule[_window(position, self.retarget_interval if len(schedule) > 1 else None)])
+            if not self.valid_proof(previous.proof, block.proof, previous.hash, target):
+                raise ValueError(f"Block {block.index} has an invalid proof")
+            previous = block
+
+        orphaned = self.chain[fork_position:]
+        del self.chain[fork_position:]
+        self.chain.extend(blocks)
+        del self._block_json[fork_position:]
+        if self._indexed_upto > fork_position:
+            # Postings are append-only, so rebuild them lazily on the next query
+            self._indexed_upto = 0
+            self._tx_by_id, self._by_sender, self._by_recipient, self._by_category, self._balances = {}, {}, {}, {}, {}
+
+        confirmed = {tx.id for block in blocks for tx in block.transactions}
+        for tx_id in confirmed:
+            self.mempool.remove(tx_id)
+        self.mempool.add_many(tx for block in orphaned for tx in block.transactions if tx.id not in confirmed)
+        self.target = schedule[-1]
+        return orphaned
+
+    def retarget(self) -> bool:
+        """Rescale the target if the chain just completed a retarget window"""
+        if self.target is None or not self.target_block_time or len(self.chain) <= self.retarget_interval:
+            return False
+        if (len(self.chain) - 1) % self.retarget_interval:
+            return False
+
+        first = self.chain[-self.retarget_interval - 1]
+        self.target = next_target(self.target, self.chain[-1].timestamp - first.timestamp, self.target_block_time, self.retarget_interval, self.max_retarget_factor)
+        self.difficulty_prefix = "0" * int(self.difficulty_bits // 4)
+        return True
+
+    @property
+    def current_transactions(self) -> List[Transaction]:
+        return self.mempool.transactions()
+
+    @property
+    def mempool_version(self) -> int:
+        # Bumped whenever the mempool changes, so callers can tell when a
+        # serialized view of the chain is out of date.
+        return self.mempool.version
+
+    def is_known_transaction(self, tx_id) -> bool:
+        """True if the id is pending or already confirmed.
+
+        An in-memory chain checks every confirmed id. A store-backed chain is
+        not indexed on open, since that decodes every stored block: it checks
+        blocks added since the open and those an index query has already
+        loaded, so an id confirmed only in an older, not yet indexed block can
+        still be accepted into the mempool.
+        """
+        if tx_id in self.mempool:
+            return True
+        return self._is_confirmed(tx_id)
+
+    def _is_confirmed(self, tx_id) -> bool:
+        if self.store is None:
+            self._catch_up_indexes()
+        return tx_id in self._tx_by_id or tx_id in self._unindexed_ids
+
     def new_transaction(self, sender: str, recipient: str, amount: float, id: int = None, ratings: float = None, description: str = "", status: str = "pending", category: str = "") -> int:
         tx = Transaction(sender, recipient, amount, id=id, ratings=ratings, description=description, status=status, category=category)
-        self.current_transactions.append(tx)
+        if self.is_known_transaction(tx.id) or not self.mempool.add(tx):
+            raise DuplicateTransactionError(f"duplicate transaction id {tx.id}")
         return self.last_block.index + 1
 
+    def new_transactions(self, records: Sequence[Dict]) -> Dict:
+        """
+        Add many transaction dicts to the mempool at once
+
+        Invalid records (including ids that are not hashable, such as JSON
+        lists) and ids that are already pending or confirmed are skipped and
+        reported rather than failing the whole batch; see is_known_transaction
+        for which confirmed ids a store-backed chain checks.
+        """
+        txs, invalid, duplicates, batch_ids = [], [], [], set()
+        for position, record in enumerate(records):
+            try:
+                tx = Transaction.from_dict(record)
+                hash(tx.id)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                invalid.append({"position": position, "error": str(e)})
+                continue
+            if tx.id in batch_ids or self._is_confirmed(tx.id):
+                duplicates.append(tx.id)
+                continue
+            batch_ids.add(tx.id)
+            txs.append(tx)
+        accepted, pending = self.mempool.add_many(txs)
+        return {"accepted": accepted, "duplicates": duplicates + pending, "invalid": invalid, "block_index": self.last_block.index + 1}
+
     @property
     def last_block(self) -> Block:
         return self.chain[-1]
 
-    def proof_of_work(self, last_proof: int, last_hash: str) -> int:
-        proof = 0
-        while not self.valid_proof(last_proof, proof, last_hash):
-            proof += 1
-        return proof
+    @property
+    def difficulty_bits(self) -> Optional[float]:
+        if self.target is None:
+            return None
+        return bits_for_target(self.target)
+
+    def proof_of_work(self, last_proof: int, last_hash: str, workers: int = 1) -> int:
+        if self.target is None:
+            started = time.perf_counter()
+            proof = 0
+            while not self.valid_proof(last_proof, proof, last_hash):
+                proof += 1
+            elapsed = time.perf_counter() - started
+            self.last_mining_stats = {
+                "proof": proof,
+                "hashes": proof + 1,
+                "elapsed": elapsed,
+                "hashes_per_sec": (proof + 1) / elapsed if elapsed > 0 else 0.0,
+                "workers": 1,
+            }
+            return proof
 
-    def valid_proof(self, last_proof: int, proof: int, last_hash: str) -> bool:
+        self.last_mining_stats = mine(last_proof, last_hash, self.target, workers=workers)
+        return self.last_mining_stats["proof"]
+
+    def valid_proof(self, last_proof: int, proof: int, last_hash: str, target: Optional[int] = None) -> bool:
         guess = f"{last_proof}{proof}{last_hash}".encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash.startswith(self.difficulty_prefix)
+        target = target if target is not None else self.target
+        if target is None:
+            return hashlib.sha256(guess).hexdigest().startswith(self.difficulty_prefix)
+        return hashlib.sha256(guess).digest() < target_bytes(target)
+
+    def _index_block(self, position: int, block: Block):
+        for offset, tx in enumerate(block.transactions):
+            posting = (position, offset)
+            self._tx_by_id[tx.id] = posting
+            self._by_sender.setdefault(tx.sender, []).append(posting)
+            self._by_recipient.setdefault(tx.recipient, []).append(posting)
+            self._by_category.setdefault(tx.category, []).append(posting)
+            self._balances[tx.sender] = self._balances.get(tx.sender, 0.0) - tx.amount
+            self._balances[tx.recipient] = self._balances.get(tx.recipient, 0.0) + tx.amount
+        self._indexed_upto = position + 1
+
+    def _index_new_block(self, block: Block):
+        # Index a block just added at the tip, or remember its ids if the
+        # indexes have not caught up with the blocks before it
+        if self._indexed_upto == len(self.chain) - 1:
+            self._index_block(len(self.chain) - 1, block)
+        else:
+            self._unindexed_ids.update(tx.id for tx in block.transactions)
+
+    def _catch_up_indexes(self):
+        for position in range(self._indexed_upto, len(self.chain)):
+            self._index_block(position, self.chain[position])
+        self._unindexed_ids.clear()
+
+    def _resolve(self, postings) -> List[Dict]:
+        results = []
+        for position, offset in postings:
+            block = self.chain[position]
+            tx = block.transactions[offset].to_dict()
+            tx["block_index"] = block.index
+            results.append(tx)
+        return results
+
+    def get_transaction(self, tx_id) -> Optional[Dict]:
+        """Confirmed transaction by id, with the index of its block"""
+        self._catch_up_indexes()
+        posting = self._tx_by_id.get(tx_id)
+        return self._resolve([posting])[0] if posting else None
+
+    def transactions_for_address(self, address: str, role: str = "any") -> List[Dict]:
+        """Confirmed transactions where `address` is the sender, recipient or either (role "any")"""
+        self._catch_up_indexes()
+        if role == "sender":
+            postings = self._by_sender.get(address, [])
+        elif role == "recipient":
+            postings = self._by_recipient.get(address, [])
+        elif role == "any":
+            postings = sorted(set(self._by_sender.get(address, [])) | set(self._by_recipient.get(address, [])))
+        else:
+            raise ValueError(f"role must be 'sender', 'recipient' or 'any', not {role!r}")
+        return self._resolve(postings)
+
+    def transactions_by_category(self, category: str) -> List[Dict]:
+        self._catch_up_indexes()
+        return self._resolve(self._by_category.get(category, []))
+
+    def balance(self, address: str) -> float:
+        """Amount received minus amount sent over all confirmed transactions"""
+        self._catch_up_indexes()
+        return self._balances.get(address, 0.0)
+
+    def add_checkpoint(self, index: Optional[int] = None, block_hash: Optional[str] = None):
+        """Trust block `index` (default: the last block) with the given or current hash"""
+        index = index or len(self.chain)
+        self.checkpoints[index] = block_hash or self.chain[index - 1].hash
+
+    def validate(self, workers: Optional[int] = None, use_checkpoints: bool = True, checkpoint: bool = False) -> Dict:
+        """Validate the chain with `validate_chain`; see there for the report.
+
+        With `checkpoint`, a valid chain's last block becomes a checkpoint so
+        the next validation only covers blocks added since.
+        """
+        blocks = self.store if self.store is not None else _BlockRecords(self.chain)
+        report = validate_chain(blocks, self.difficulty_prefix, self.checkpoints if use_checkpoints else None, workers, start_target=self.start_target, target_block_time=self.target_block_time, retarget_interval=self.retarget_interval, max_retarget_factor=self.max_retarget_factor)
+        if report["valid"] and checkpoint and len(self.chain):
+            self.add_checkpoint()
+        return report
+
+    def valid_chain(self, workers: Optional[int] = None) -> bool:
+        return self.validate(workers)["valid"]
+
+    def block_json(self, position: int) -> bytes:
+        """Compact JSON encoding of the block at `position`, reused across calls"""
+        if self.store is not None:
+            return self.store.read_raw(position)
+        if position < 0:
+            position += len(self.chain)
+        while len(self._block_json) <= position:
+            self._block_json.append(json.dumps(self.chain[len(self._block_json)].to_dict(), separators=(",", ":")).encode())
+        return self._block_json[position]
 
     def to_dict(self) -> Dict:
         return {
@@ -115,5 +855,6 @@ class Blockchain:
             "chain": [b.to_dict() for b in self.chain],
             "mempool": [t.to_dict() for t in self.current_transactions],
             "difficulty_prefix": self.difficulty_prefix,
+            "difficulty_bits": self.difficulty_bits,
         }
 
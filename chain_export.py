@@ -0,0 +1,261 @@
+"""
+Chain Export
+Streaming CSV, NDJSON and Parquet writers over confirmed transactions
+"""
+
+import io
+import csv
+import sys
+import json
+import logging
+import argparse
+from typing import Dict, Iterable, Iterator, Optional
+
+# Parquet support is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+EXPORT_FIELDS = [
+    'block_index', 'block_hash', 'block_timestamp', 'miner',
+    'id', 'timestamp', 'sender', 'recipient', 'amount', 'ratings', 'description', 'status', 'category',
+]
+
+# Rows are buffered into chunks of this many before being handed to the caller
+DEFAULT_BATCH_ROWS = 1000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_rows(blockchain, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Yield one flat row per confirmed transaction, block by block
+
+    Args:
+        blockchain: Blockchain to export, or a sequence of its blocks (e.g. a StoredChain)
+        start: First block position (0-based)
+        stop: Block position to stop before (defaults to the chain length when iteration starts)
+
+    Returns:
+        Iterator of dicts keyed by EXPORT_FIELDS
+    """
+    chain = getattr(blockchain, 'chain', blockchain)
+    # Blocks mined while an export is running are left out, so the export is a
+    # consistent prefix of the chain.
+    stop = len(chain) if stop is None else min(stop, len(chain))
+    for position in range(max(start, 0), stop):
+        block = chain[position]
+        for tx in block.transactions:
+            row = {
+                'block_index': block.index,
+                'block_hash': block.hash,
+                'block_timestamp': block.timestamp,
+                'miner': block.miner,
+            }
+            row.update(tx.to_dict())
+            yield row
+
+
+def _batches(rows: Iterable[Dict], batch_rows: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows: Iterable[Dict], batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[str]:
+    """Encode rows as CSV, yielding the header and then one text chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in _batches(rows, batch_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[Dict], batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[str]:
+    """Encode rows as newline-delimited JSON, one text chunk per batch"""
+    for batch in _batches(rows, batch_rows):
+        yield ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in batch)
+
+
+class _ParquetSink:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _parquet_schema():
+    return pa.schema([
+        ('block_index', pa.int64()),
+        ('block_hash', pa.string()),
+        ('block_timestamp', pa.float64()),
+        ('miner', pa.string()),
+        # Transaction ids are not guaranteed to be integers, so they are stored as text
+        ('id', pa.string()),
+        ('timestamp', pa.float64()),
+        ('sender', pa.string()),
+        ('recipient', pa.string()),
+        ('amount', pa.float64()),
+        ('ratings', pa.float64()),
+        ('description', pa.string()),
+        ('status', pa.string()),
+        ('category', pa.string()),
+    ])
+
+
+def iter_parquet(rows: Iterable[Dict], batch_rows: int = DEFAULT_BATCH_ROWS * 10) -> Iterator[bytes]:
+    """
+    Encode rows as Parquet, one row group per batch
+
+    Requires pyarrow. Bytes are yielded as each row group is written, so only
+    one batch is held in memory at a time.
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = _parquet_schema()
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    try:
+        for batch in _batches(rows, batch_rows):
+            columns = {name: [row.get(name) for row in batch] for name in schema.names}
+            columns['id'] = [None if value is None else str(value) for value in columns['id']]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_export(blockchain, fmt: str = 'csv', start: int = 0, stop: Optional[int] = None) -> Iterator:
+    """
+    Stream an export of the chain in the given format
+
+    Args:
+        blockchain: Blockchain to export
+        fmt: One of 'csv', 'ndjson' or 'parquet'
+        start: First block position
+        stop: Block position to stop before
+
+    Returns:
+        Iterator of str chunks (csv, ndjson) or bytes chunks (parquet)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'parquet' and not PYARROW_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    rows = iter_rows(blockchain, start, stop)
+    if fmt == 'csv':
+        return iter_csv(rows)
+    if fmt == 'ndjson':
+        return iter_ndjson(rows)
+    return iter_parquet(rows)
+
+
+def write_export(blockchain, fmt: str, output, start: int = 0, stop: Optional[int] = None) -> int:
+    """Write an export to a binary file object and return the number of bytes written"""
+    written = 0
+    for chunk in iter_export(blockchain, fmt, start, stop):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def block_range(first: Optional[int] = None, last: Optional[int] = None):
+    """
+    Turn an inclusive range of 1-based block indexes into (start, stop) positions
+
+    Exports take block indexes like GET /chain's `from`, so `first=1, last=10`
+    covers the first ten blocks.
+
+    Raises:
+        ValueError: If first < 1 or last < first - 1
+    """
+    first = 1 if first is None else first
+    if first < 1:
+        raise ValueError("from must be a block index >= 1")
+    if last is not None and last < first - 1:
+        raise ValueError("to must not be before from")
+    return first - 1, last
+
+
+def main(argv=None):
+    from blockchain import StoredChain
+    from chain_store import ChainStore
+
+    parser = argparse.ArgumentParser(description="Dump the transactions of a stored chain")
+    parser.add_argument('store', help="Chain store directory (as used for CHAIN_STORE_PATH)")
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('-o', '--output', help="Output file (defaults to stdout)")
+    parser.add_argument('--from', dest='first', type=int, default=1, help="First block index (1-based)")
+    parser.add_argument('--to', dest='last', type=int, default=None, help="Last block index, inclusive")
+    args = parser.parse_args(argv)
+    try:
+        start, stop = block_range(args.first, args.last)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Opened read-only: a missing store is an error rather than a new chain,
+    # and a store a node is appending to is never truncated
+    try:
+        store = ChainStore(args.store, read_only=True)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    try:
+        chain = StoredChain(store)
+        if args.output:
+            with open(args.output, 'wb') as output:
+                written = write_export(chain, args.format, output, start, stop)
+        else:
+            written = write_export(chain, args.format, sys.stdout.buffer, start, stop)
+            sys.stdout.buffer.flush()
+        logging.info(f"Exported {written} bytes of {args.format}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
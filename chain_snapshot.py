@@ -0,0 +1,258 @@
+"""
+Chain Snapshots
+Incremental, segment-based chain backups to cloud storage
+"""
+
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from blockchain import Block, Blockchain
+from cloud_storage import CloudStorageManager, cloud_storage
+from storage_codecs import get_codec
+
+MANIFEST_VERSION = 1
+DEFAULT_SEGMENT_SIZE = 1000
+DEFAULT_SEGMENT_CODEC = 'json+gzip'
+
+# Snapshot names become storage key components, so only plain names are allowed
+_SNAPSHOT_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def check_snapshot_name(name: str) -> str:
+    """
+    Validate a snapshot name
+
+    Raises:
+        ValueError: If the name is not made of letters, digits, '_' and '-'
+    """
+    if not isinstance(name, str) or not _SNAPSHOT_NAME.match(name):
+        raise ValueError(f"Invalid snapshot name: {name!r}")
+    return name
+
+
+def _manifest_key(name: str) -> str:
+    return f"snapshots/{check_snapshot_name(name)}/manifest.json"
+
+
+def _segment_prefix(name: str) -> str:
+    return f"snapshots/{check_snapshot_name(name)}/segments/"
+
+
+def _owned_segment_key(name: str, key: Any) -> bool:
+    # Manifest contents come from storage; only keys under this snapshot's
+    # own segment prefix are ever downloaded or deleted
+    return (isinstance(key, str) and key.startswith(_segment_prefix(name))
+            and '/' not in key[len(_segment_prefix(name)):] and '..' not in key)
+
+
+def segment_digest(blocks: List[Dict[str, Any]]) -> str:
+    """SHA-256 of a segment's canonical JSON, independent of the codec it is stored with"""
+    canonical = json.dumps(blocks, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def load_manifest(name: str = 'chain', storage: Optional[CloudStorageManager] = None) -> Optional[Dict[str, Any]]:
+    """Download the manifest of a snapshot, or None if there is none"""
+    storage = storage or cloud_storage
+    return storage.download_data(_manifest_key(name))
+
+
+def backup_chain(blockchain: Blockchain, name: str = 'chain', storage: Optional[CloudStorageManager] = None,
+                 segment_size: int = DEFAULT_SEGMENT_SIZE, codec: str = DEFAULT_SEGMENT_CODEC) -> Dict[str, Any]:
+    """
+    Back up a chain as immutable, content-hashed segments plus a manifest
+
+    Blocks are grouped into segments of `segment_size` at fixed boundaries.
+    A segment from the previous manifest is reused when it covers the same
+    blocks and its last block hash still matches the chain (hashes link each
+    block to all before it), so only new or changed segments are uploaded.
+    The manifest is written last, so a failed backup leaves the previous
+    snapshot intact; segments only the old manifest referenced (e.g. a
+    previous partial tail) are deleted afterwards.
+
+    Args:
+        blockchain: Chain to back up
+        name: Snapshot name
+        storage: Storage manager (defaults to the global cloud_storage)
+        segment_size: Blocks per segment
+        codec: Codec for segment objects
+
+    Returns:
+        Dictionary describing the backup
+    """
+    check_snapshot_name(name)
+    storage = storage or cloud_storage
+    codec = get_codec(codec)
+    chain = blockchain.chain
+    length = len(chain)
+    previous = load_manifest(name, storage) or {}
+    previous_segments = [segment for segment in previous.get('segments', [])
+                         if _owned_segment_key(name, segment.get('key'))]
+    reusable = {segment['start']: segment for segment in previous_segments}
+
+    segments, uploads = [], {}
+    for start in range(0, length, segment_size):
+        count = min(segment_size, length - start)
+        last_hash = chain[start + count - 1].hash
+        old = reusable.get(start)
+        if old is not None and old['count'] == count and old['last_hash'] == last_hash:
+            segments.append(old)
+            continue
+        blocks = [chain[position].to_dict() for position in range(start, start + count)]
+        digest = segment_digest(blocks)
+        key = f"{_segment_prefix(name)}{start:010d}-{digest}{codec.suffix}"
+        uploads[key] = blocks
+        segments.append({
+            'start': start,
+            'count': count,
+            'first_hash': blocks[0]['hash'],
+            'last_hash': last_hash,
+            'sha256': digest,
+            'key': key,
+        })
+
+    results = storage.upload_many(uploads, codec=codec.name) if uploads else {}
+    failed = [key for key, ok in results.items() if not ok]
+    if failed:
+        logging.error(f"Snapshot {name}: {len(failed)} segment uploads failed; keeping the previous manifest")
+        return {'success': False, 'name': name, 'failed_segments': failed}
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'name': name,
+        'created_at': datetime.now().isoformat(),
+        'length': length,
+        'tip_hash': chain[-1].hash if length else None,
+        'segment_size': segment_size,
+        'difficulty_prefix': blockchain.difficulty_prefix,
+        'target_block_time': blockchain.target_block_time,
+        'retarget_interval': blockchain.retarget_interval,
+        'max_retarget_factor': blockchain.max_retarget_factor,
+        'segments': segments,
+    }
+    if not storage.upload_data(manifest, _manifest_key(name), codec='json'):
+        return {'success': False, 'name': name, 'error': 'manifest upload failed'}
+
+    current = {segment['key'] for segment in segments}
+    stale = [segment['key'] for segment in previous_segments if segment['key'] not in current]
+    if stale:
+        storage.delete_many(stale)
+
+    logging.info(f"Snapshot {name}: {length} blocks, uploaded {len(uploads)} segments, reused {len(segments) - len(uploads)}")
+    return {
+        'success': True,
+        'name': name,
+        'length': length,
+        'segments': len(segments),
+        'uploaded_segments': len(uploads),
+        'reused_segments': len(segments) - len(uploads),
+        'deleted_segments': len(stale),
+    }
+
+
+def restore_chain(name: str = 'chain', storage: Optional[CloudStorageManager] = None, store=None,
+                  columnar: bool = False, max_workers: Optional[int] = None) -> Blockchain:
+    """
+    Rebuild a Blockchain from a snapshot
+
+    Segments are downloaded in parallel, `max_workers` at a time, and each is
+    checked against the manifest digest. Blocks are rebuilt with
+    Block.from_dict, which recomputes their hashes, and appended with
+    Blockchain.append_block, which checks links and proofs.
+
+    Args:
+        name: Snapshot name
+        storage: Storage manager (defaults to the global cloud_storage)
+        store: Optional empty ChainStore to restore into
+        columnar: Store transactions column-wise
+        max_workers: Segments downloaded concurrently
+
+    Returns:
+        The restored Blockchain
+
+    Raises:
+        ValueError: If the snapshot is missing or fails verification
+    """
+    storage = storage or cloud_storage
+    manifest = load_manifest(name, storage)
+    if manifest is None:
+        raise ValueError(f"No snapshot named {name}")
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')}")
+
+    segments = manifest['segments']
+    for segment in segments:
+        if not _owned_segment_key(name, segment.get('key')):
+            raise ValueError(f"Snapshot {name}: segment key {segment.get('key')!r} is outside the snapshot")
+    window = max_workers or storage.max_workers
+    blockchain = None
+    expected_start = 0
+    for offset in range(0, len(segments), window):
+        batch = segments[offset:offset + window]
+        downloaded = storage.download_many([segment['key'] for segment in batch], max_workers=window)
+        for segment in batch:
+            blocks = downloaded.get(segment['key'])
+            if blocks is None:
+                raise ValueError(f"Snapshot {name}: segment {segment['key']} is missing")
+            if segment['start'] != expected_start or len(blocks) != segment['count']:
+                raise ValueError(f"Snapshot {name}: segment {segment['key']} does not follow block {expected_start}")
+            if segment_digest(blocks) != segment['sha256']:
+                raise ValueError(f"Snapshot {name}: segment {segment['key']} does not match its digest")
+            for data in blocks:
+                block = Block.from_dict(data, columnar=columnar)
+                if blockchain is None:
+                    blockchain = Blockchain(
+                        difficulty_prefix=manifest['difficulty_prefix'],
+                        target_block_time=manifest.get('target_block_time'),
+                        retarget_interval=manifest.get('retarget_interval', 10),
+                        max_retarget_factor=manifest.get('max_retarget_factor', 4.0),
+                        columnar=columnar,
+                        store=store,
+                        genesis=block
+                    )
+                else:
+                    blockchain.append_block(block)
+            expected_start += segment['count']
+
+    if blockchain is None or len(blockchain.chain) != manifest['length'] or blockchain.last_block.hash != manifest['tip_hash']:
+        raise ValueError(f"Snapshot {name}: restored chain does not match the manifest tip")
+    logging.info(f"Restored snapshot {name}: {manifest['length']} blocks from {len(segments)} segments")
+    return blockchain
+
+
+def main(argv=None):
+    from chain_store import ChainStore
+
+    parser = argparse.ArgumentParser(description="Back up or restore a stored chain as cloud snapshots")
+    parser.add_argument('command', choices=['backup', 'restore'])
+    parser.add_argument('store', help="Chain store directory (as used for CHAIN_STORE_PATH)")
+    parser.add_argument('--name', default='chain', help="Snapshot name")
+    parser.add_argument('--segment-size', type=int, default=DEFAULT_SEGMENT_SIZE)
+    parser.add_argument('--codec', default=DEFAULT_SEGMENT_CODEC)
+    args = parser.parse_args(argv)
+    if not _SNAPSHOT_NAME.match(args.name):
+        parser.error(f"invalid snapshot name {args.name!r}: use letters, digits, '_' and '-'")
+
+    store = ChainStore(args.store)
+    try:
+        if args.command == 'backup':
+            result = backup_chain(Blockchain(store=store), args.name, segment_size=args.segment_size, codec=args.codec)
+        else:
+            if len(store):
+                parser.error(f"{args.store} already holds a chain")
+            blockchain = restore_chain(args.name, store=store)
+            result = {'success': True, 'name': args.name, 'length': len(blockchain.chain)}
+    finally:
+        store.close()
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
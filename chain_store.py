@@ -0,0 +1,179 @@
+"""
+Append-only Chain Store
+Length-prefixed block log plus an offset index, read back through mmap
+"""
+
+import io
+import os
+import json
+import mmap
+import struct
+import logging
+import threading
+from typing import Dict, Iterator, Optional
+
+_LENGTH = struct.Struct(">I")
+_OFFSET = struct.Struct("<Q")
+
+
+class ChainStore:
+    """
+    On-disk block log for a Blockchain
+
+    The store is a directory holding two files:
+        blocks.log  records of a 4-byte big-endian length followed by the block's JSON
+        blocks.idx  one little-endian uint64 per block: the offset of its record in blocks.log
+
+    Appends go through the OS on every call but are fsynced only every
+    `sync_every` blocks (and on flush/close). Reads use mmap, so opening a
+    store and serving a range of blocks never loads the whole chain.
+
+    With `read_only` the store must already exist, nothing is created or
+    truncated (a torn tail is just left unread) and appends are refused, so
+    tools can read a store a live node is writing to.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, read_only: bool = False):
+        self.path = path
+        self.sync_every = max(sync_every, 1)
+        self.read_only = read_only
+
+        self._log_path = os.path.join(path, 'blocks.log')
+        self._idx_path = os.path.join(path, 'blocks.idx')
+        if read_only:
+            for required in (self._log_path, self._idx_path):
+                if not os.path.isfile(required):
+                    raise FileNotFoundError(f"No chain store at {path} ({required} is missing)")
+            self._log = self._idx = None
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._log = open(self._log_path, 'ab')
+            self._idx = open(self._idx_path, 'ab')
+        self._closed = False
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._log_map: Optional[mmap.mmap] = None
+        self._idx_map: Optional[mmap.mmap] = None
+
+        self._count, self._end = self._recover()
+        logging.info(f"Opened chain store {path} with {self._count} blocks")
+
+    def _recover(self):
+        """Drop a torn tail left by a crash between writing a record and its index entry"""
+        log_size = os.path.getsize(self._log_path)
+        count = os.path.getsize(self._idx_path) // _OFFSET.size
+
+        with open(self._log_path, 'rb') as log, open(self._idx_path, 'rb') as idx:
+            while count:
+                idx.seek((count - 1) * _OFFSET.size)
+                offset, = _OFFSET.unpack(idx.read(_OFFSET.size))
+                log.seek(offset)
+                header = log.read(_LENGTH.size)
+                if len(header) == _LENGTH.size:
+                    end = offset + _LENGTH.size + _LENGTH.unpack(header)[0]
+                    if end <= log_size:
+                        break
+                count -= 1
+            else:
+                end = 0
+
+        if self.read_only:
+            if log_size != end:
+                logging.warning(f"Chain store {self.path}: ignoring {log_size - end} bytes past block {count}")
+            return count, end
+        if os.path.getsize(self._idx_path) != count * _OFFSET.size:
+            logging.warning(f"Chain store {self.path}: truncating index to {count} blocks")
+            self._idx.truncate(count * _OFFSET.size)
+        if log_size != end:
+            logging.warning(f"Chain store {self.path}: truncating {log_size - end} bytes of torn log")
+            self._log.truncate(end)
+        return count, end
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, block: Dict) -> int:
+        """Append a block dict and return its position"""
+        return self.append_raw(json.dumps(block, separators=(',', ':')).encode())
+
+    def append_raw(self, record: bytes) -> int:
+        """Append an already-serialized block record and return its position"""
+        if self.read_only:
+            raise io.UnsupportedOperation(f"Chain store {self.path} is open read-only")
+        with self._lock:
+            position = self._count
+            self._log.write(_LENGTH.pack(len(record)))
+            self._log.write(record)
+            self._log.flush()
+            self._idx.write(_OFFSET.pack(self._end))
+            self._idx.flush()
+            self._end += _LENGTH.size + len(record)
+            self._count += 1
+            self._pending += 1
+            if self._pending >= self.sync_every:
+                self.sync()
+            return position
+
+    def sync(self):
+        """fsync the log before the index, so an index entry never outlives its record"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._idx.flush()
+            os.fsync(self._idx.fileno())
+            self._pending = 0
+
+    def _maps(self):
+        # Remap when the files have grown past the current mappings.
+        if self._log_map is None or len(self._log_map) < self._end:
+            if self._log_map is not None:
+                self._log_map.close()
+            with open(self._log_path, 'rb') as f:
+                self._log_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._idx_map is None or len(self._idx_map) < self._count * _OFFSET.size:
+            if self._idx_map is not None:
+                self._idx_map.close()
+            with open(self._idx_path, 'rb') as f:
+                self._idx_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._log_map, self._idx_map
+
+    def read_raw(self, position: int) -> bytes:
+        """Serialized JSON record of the block at `position` (negative positions count from the end)"""
+        with self._lock:
+            if position < 0:
+                position += self._count
+            if not 0 <= position < self._count:
+                raise IndexError(f"block position {position} out of range")
+            log_map, idx_map = self._maps()
+            offset, = _OFFSET.unpack_from(idx_map, position * _OFFSET.size)
+            length, = _LENGTH.unpack_from(log_map, offset)
+            start = offset + _LENGTH.size
+            return log_map[start:start + length]
+
+    def __getitem__(self, position: int) -> bytes:
+        return self.read_raw(position)
+
+    def read(self, position: int) -> Dict:
+        return json.loads(self.read_raw(position))
+
+    def iter_raw(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Serialized records for positions start..stop-1"""
+        stop = self._count if stop is None else min(stop, self._count)
+        for position in range(max(start, 0), stop):
+            yield self.read_raw(position)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self.sync()
+            for mapping in (self._log_map, self._idx_map):
+                if mapping is not None:
+                    mapping.close()
+            self._log_map = self._idx_map = None
+            if not self.read_only:
+                self._log.close()
+                self._idx.close()
+            self._closed = True
@@ -2,9 +2,14 @@ import os
 import json
 import logging
 import requests
-from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Optional, List, Iterable
 from datetime import datetime
 
+from ipfs_cache import IPFSCache
+
 class PinataCloudManager:
     """Dedicated Pinata Cloud storage manager for blockchain applications"""
     
@@ -12,29 +17,80 @@ class PinataCloudManager:
         self.api_key = os.getenv('PINATA_API_KEY')
         self.secret_key = os.getenv('PINATA_SECRET_KEY')
         self.jwt_token = os.getenv('PINATA_JWT')
-        self.base_url = "https://api.pinata.cloud"
+        self.base_url = os.getenv('PINATA_API_URL', "https://api.pinata.cloud").rstrip('/')
+        self.gateway_url = os.getenv('PINATA_GATEWAY_URL', "https://gateway.pinata.cloud").rstrip('/')
+        self.max_workers = int(os.getenv('PINATA_MAX_WORKERS', 8))
+        self.max_retries = int(os.getenv('PINATA_MAX_RETRIES', 3))
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
+        # One keep-alive session shared by all calls and batch workers
+        self.session = self._build_session()
+        
+        # IPFS content is immutable, so retrievals are cached by CID
+        # (set IPFS_CACHE_DIR to an empty string to disable)
+        cache_dir = os.getenv('IPFS_CACHE_DIR', os.path.join('.cache', 'ipfs'))
+        self.cache = None
+        if cache_dir:
+            try:
+                self.cache = IPFSCache(
+                    cache_dir,
+                    max_bytes=int(os.getenv('IPFS_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+                    hot_entries=int(os.getenv('IPFS_CACHE_HOT_ENTRIES', 128)),
+                    decode=self._decode_content
+                )
+            except OSError as e:
+                logging.error(f"IPFS cache disabled, cannot use {cache_dir}: {e}")
+        
         # Test authentication on initialization
         if not self._authenticate():
             self.logger.error("Failed to authenticate with Pinata Cloud")
     
-    def _get_headers(self) -> Dict[str, str]:
-        """Get authentication headers for API requests"""
-        return {
-            'Authorization': f'Bearer {self.jwt_token}',
-            'Content-Type': 'application/json'
-        }
+    def _build_session(self) -> requests.Session:
+        """
+        Create a pooled HTTP session with retries
+        
+        Connections are reused across calls, and up to `max_workers` are kept
+        open per host so batch operations do not queue for a connection.
+        Requests that hit 429 or a 5xx response, or fail to connect, are
+        retried with exponential backoff, honouring Retry-After. POST is
+        included: pinning the same content twice yields the same hash.
+        """
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST', 'DELETE']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, 1), max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+    
+    def _api_request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send a request to the Pinata API with the JWT attached
+        
+        The token is added per request rather than to the session, so calls
+        to the gateway (or any other host) never carry it.
+        """
+        headers = {'Authorization': f'Bearer {self.jwt_token}'}
+        return self.session.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
     
     def _authenticate(self) -> bool:
         """Authenticate with Pinata Cloud using JWT token"""
         try:
-            response = requests.get(
-                f"{self.base_url}/data/testAuthentication",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'GET', "/data/testAuthentication",
                 timeout=30
             )
             if response.status_code == 200:
@@ -69,9 +125,8 @@ class PinataCloudManager:
                 }
             }
             
-            response = requests.post(
-                f"{self.base_url}/pinning/pinJSONToIPFS",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'POST', "/pinning/pinJSONToIPFS",
                 json=payload,
                 timeout=60
             )
@@ -126,11 +181,8 @@ class PinataCloudManager:
                     'pinataMetadata': json.dumps(pinata_metadata)
                 }
                 
-                response = requests.post(
-                    f"{self.base_url}/pinning/pinFileToIPFS",
-                    headers={
-                        'Authorization': f'Bearer {self.jwt_token}'
-                    },
+                response = self._api_request(
+                    'POST', "/pinning/pinFileToIPFS",
                     files=files,
                     data=data,
                     timeout=60
@@ -161,41 +213,42 @@ class PinataCloudManager:
                 'error': str(e)
             }
     
-    def retrieve_data(self, ipfs_hash: str) -> Dict[str, Any]:
+    @staticmethod
+    def _decode_content(content: bytes) -> Dict[str, Any]:
+        """Parse retrieved content as JSON, falling back to text"""
+        text = content.decode('utf-8', errors='replace')
+        try:
+            return {'data': json.loads(text), 'content_type': 'json'}
+        except json.JSONDecodeError:
+            return {'data': text, 'content_type': 'text'}
+    
+    def retrieve_data(self, ipfs_hash: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Retrieve data from Pinata Cloud using IPFS hash
         
         Args:
             ipfs_hash: IPFS hash of the content to retrieve
+            use_cache: Serve from and fill the local content cache
             
         Returns:
             Dictionary containing the retrieved data and metadata
         """
         try:
+            if use_cache and self.cache is not None:
+                cached = self.cache.get(ipfs_hash)
+                if cached is not None:
+                    return {'success': True, **cached, 'ipfs_hash': ipfs_hash, 'cached': True}
+            
             # Using Pinata's gateway
-            gateway_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}"
+            gateway_url = f"{self.gateway_url}/ipfs/{ipfs_hash}"
             
-            response = requests.get(gateway_url, timeout=30)
+            response = self.session.get(gateway_url, timeout=30)
             
             if response.status_code == 200:
-                content = response.text
-                try:
-                    # Try to parse as JSON
-                    data = json.loads(content)
-                    return {
-                        'success': True,
-                        'data': data,
-                        'content_type': 'json',
-                        'ipfs_hash': ipfs_hash
-                    }
-                except json.JSONDecodeError:
-                    # Return as text if not JSON
-                    return {
-                        'success': True,
-                        'data': content,
-                        'content_type': 'text',
-                        'ipfs_hash': ipfs_hash
-                    }
+                decoded = self._decode_content(response.content)
+                if use_cache and self.cache is not None:
+                    self.cache.put(ipfs_hash, response.content, decoded)
+                return {'success': True, **decoded, 'ipfs_hash': ipfs_hash}
             else:
                 self.logger.error(f"Retrieve failed: {response.status_code} - {response.text}")
                 return {
@@ -227,9 +280,8 @@ class PinataCloudManager:
                 "hashToPin": ipfs_hash
             }
             
-            response = requests.post(
-                f"{self.base_url}/pinning/pinByHash",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'POST', "/pinning/pinByHash",
                 json=payload,
                 timeout=30
             )
@@ -268,9 +320,8 @@ class PinataCloudManager:
             Dictionary with unpinning result
         """
         try:
-            response = requests.delete(
-                f"{self.base_url}/pinning/unpin/{ipfs_hash}",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'DELETE', f"/pinning/unpin/{ipfs_hash}",
                 timeout=30
             )
             
@@ -305,9 +356,8 @@ class PinataCloudManager:
             Dictionary containing list of pinned files
         """
         try:
-            response = requests.get(
-                f"{self.base_url}/data/pinList?status=pinned",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'GET', "/data/pinList?status=pinned",
                 timeout=30
             )
             
@@ -345,9 +395,8 @@ class PinataCloudManager:
             Dictionary containing file information
         """
         try:
-            response = requests.get(
-                f"{self.base_url}/data/pinList?hashContains={ipfs_hash}",
-                headers=self._get_headers(),
+            response = self._api_request(
+                'GET', f"/data/pinList?hashContains={ipfs_hash}",
                 timeout=30
             )
             
@@ -380,6 +429,53 @@ class PinataCloudManager:
                 'error': str(e),
                 'ipfs_hash': ipfs_hash
             }
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Statistics of the local IPFS content cache"""
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.stats()}
+    
+    def _run_batch(self, func, items: List, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Apply `func` to each item on a bounded thread pool, keeping input order"""
+        if not items:
+            return []
+        workers = min(max_workers or self.max_workers, len(items))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            return list(pool.map(func, items))
+    
+    def upload_many(self, items: Iterable[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Upload several JSON documents concurrently
+        
+        Args:
+            items: Dictionaries with 'data', 'name' and optional 'metadata'
+            max_workers: Concurrent uploads (defaults to PINATA_MAX_WORKERS)
+            
+        Returns:
+            One upload_json result per item, in input order
+        """
+        items = list(items)
+        results = self._run_batch(
+            lambda item: self.upload_json(item['data'], item['name'], item.get('metadata')),
+            items, max_workers
+        )
+        uploaded = sum(1 for r in results if r.get('success'))
+        self.logger.info(f"Uploaded {uploaded}/{len(items)} items to Pinata Cloud")
+        return results
+    
+    def retrieve_many(self, ipfs_hashes: Iterable[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve several IPFS hashes concurrently
+        
+        Args:
+            ipfs_hashes: IPFS hashes to retrieve
+            max_workers: Concurrent requests (defaults to PINATA_MAX_WORKERS)
+            
+        Returns:
+            One retrieve_data result per hash, in input order
+        """
+        return self._run_batch(self.retrieve_data, list(ipfs_hashes), max_workers)
 
 # Global instance
 pinata_manager = PinataCloudManager()
\ No newline at end of file
@@ -4,22 +4,26 @@ Supports AWS S3, Azure Blob Storage, and Google Cloud Storage
 """
 
 import os
-import json
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, BinaryIO, Callable, Iterable, Iterator, List
 from flask import current_app
 
+from storage_codecs import Codec, decode_stream, get_codec
+
 # Cloud storage imports
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
     from botocore.exceptions import ClientError, NoCredentialsError
     AWS_AVAILABLE = True
 except ImportError:
     AWS_AVAILABLE = False
 
 try:
-    from azure.storage.blob import BlobServiceClient, BlobClient
+    from azure.storage.blob import BlobServiceClient, BlobClient, ContentSettings
     from azure.core.exceptions import ResourceNotFoundError
     AZURE_AVAILABLE = True
 except ImportError:
@@ -32,6 +36,20 @@ try:
 except ImportError:
     GCS_AVAILABLE = False
 
+# Encoded uploads and downloads stay in memory up to this size, then spill to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# S3 deletes up to this many keys per request
+S3_DELETE_BATCH = 1000
+
+# Process umask, read once at import (os.umask can only be read by setting it);
+# local uploads get the permissions a plain open() would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# GCS chunk sizes must be a multiple of 256 KiB
+GCS_CHUNK_UNIT = 256 * 1024
+
 class CloudStorageManager:
     """Unified cloud storage manager supporting multiple providers"""
     
@@ -39,9 +57,21 @@ class CloudStorageManager:
         self.provider = os.getenv('CLOUD_STORAGE_PROVIDER', 'local').lower()
         self.bucket_name = os.getenv('CLOUD_STORAGE_BUCKET', 'blockchain-simulator')
         self.region = os.getenv('CLOUD_STORAGE_REGION', 'us-east-1')
+        # Default serialization for uploads: json, json+gzip, json+zstd or msgpack
+        self.codec = os.getenv('CLOUD_STORAGE_CODEC', 'json').lower()
+        # S3-compatible endpoint, e.g. a local stand-in server
+        self.endpoint_url = os.getenv('CLOUD_STORAGE_ENDPOINT_URL') or None
+        # Directory used by the local provider
+        self.local_dir = os.getenv('CLOUD_STORAGE_LOCAL_DIR', 'cloud_storage')
+        # Concurrent objects in batch calls, and parts per object in multipart transfers
+        self.max_workers = int(os.getenv('CLOUD_STORAGE_MAX_WORKERS', 8))
+        # Objects larger than this are transferred in parts of `multipart_chunksize`
+        self.multipart_threshold = int(os.getenv('CLOUD_STORAGE_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+        self.multipart_chunksize = int(os.getenv('CLOUD_STORAGE_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
         
         # Initialize providers
         self.aws_client = None
+        self.s3_transfer_config = None
         self.azure_client = None
         self.gcs_client = None
         
@@ -56,7 +86,13 @@ class CloudStorageManager:
                     's3',
                     region_name=self.region,
                     aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                    endpoint_url=self.endpoint_url
+                )
+                self.s3_transfer_config = TransferConfig(
+                    multipart_threshold=self.multipart_threshold,
+                    multipart_chunksize=self.multipart_chunksize,
+                    max_concurrency=self.max_workers
                 )
                 logging.info("AWS S3 client initialized")
             except Exception as e:
@@ -66,7 +102,13 @@ class CloudStorageManager:
             try:
                 connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
                 if connection_string:
-                    self.azure_client = BlobServiceClient.from_connection_string(connection_string)
+                    self.azure_client = BlobServiceClient.from_connection_string(
+                        connection_string,
+                        max_single_put_size=self.multipart_threshold,
+                        max_block_size=self.multipart_chunksize,
+                        max_single_get_size=self.multipart_threshold,
+                        max_chunk_get_size=self.multipart_chunksize
+                    )
                     logging.info("Azure Blob Storage client initialized")
             except Exception as e:
                 logging.error(f"Failed to initialize Azure Blob Storage: {e}")
@@ -78,25 +120,48 @@ class CloudStorageManager:
             except Exception as e:
                 logging.error(f"Failed to initialize Google Cloud Storage: {e}")
     
-    def upload_data(self, data: Dict[Any, Any], filename: str, content_type: str = 'application/json') -> bool:
-        """Upload data to cloud storage"""
+    def upload_data(self, data: Dict[Any, Any], filename: str, content_type: Optional[str] = None,
+                    codec: Optional[str] = None) -> bool:
+        """
+        Upload data to cloud storage
+        
+        Args:
+            data: JSON-serializable data to upload
+            filename: Object name
+            content_type: Content type to store (defaults to the codec's)
+            codec: Serialization to use (defaults to CLOUD_STORAGE_CODEC)
+        """
         
         try:
+            codec = get_codec(codec or self.codec)
+            content_type = content_type or codec.content_type
             if self.provider == 'aws' and self.aws_client:
-                return self._upload_to_s3(data, filename, content_type)
+                return self._upload_to_s3(data, filename, content_type, codec)
             elif self.provider == 'azure' and self.azure_client:
-                return self._upload_to_azure(data, filename, content_type)
+                return self._upload_to_azure(data, filename, content_type, codec)
             elif self.provider == 'gcs' and self.gcs_client:
-                return self._upload_to_gcs(data, filename, content_type)
+                return self._upload_to_gcs(data, filename, content_type, codec)
             else:
-                return self._upload_local(data, filename)
+                return self._upload_local(data, filename, codec)
                 
         except Exception as e:
             logging.error(f"Upload failed: {e}")
             return False
     
+    @staticmethod
+    def _encode(data: Dict[Any, Any], codec: Codec) -> BinaryIO:
+        """Encode data into a spooled temporary file positioned at its start"""
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            codec.encode(data, body)
+            body.seek(0)
+        except Exception:
+            body.close()
+            raise
+        return body
+    
     def download_data(self, filename: str) -> Optional[Dict[Any, Any]]:
-        """Download data from cloud storage"""
+        """Download data from cloud storage, detecting the codec it was stored with"""
         
         try:
             if self.provider == 'aws' and self.aws_client:
@@ -116,19 +181,28 @@ class CloudStorageManager:
         """List files in cloud storage"""
         
         try:
-            if self.provider == 'aws' and self.aws_client:
-                return self._list_s3_files(prefix)
-            elif self.provider == 'azure' and self.azure_client:
-                return self._list_azure_files(prefix)
-            elif self.provider == 'gcs' and self.gcs_client:
-                return self._list_gcs_files(prefix)
-            else:
-                return self._list_local_files(prefix)
-                
+            return list(self.iter_files(prefix))
         except Exception as e:
             logging.error(f"List files failed: {e}")
             return []
     
+    def iter_files(self, prefix: str = '', page_size: int = 1000) -> Iterator[str]:
+        """
+        Yield object names under a prefix, fetching one page at a time
+        
+        Args:
+            prefix: Name prefix to filter on
+            page_size: Names requested per listing call
+        """
+        if self.provider == 'aws' and self.aws_client:
+            return self._list_s3_files(prefix, page_size)
+        elif self.provider == 'azure' and self.azure_client:
+            return self._list_azure_files(prefix, page_size)
+        elif self.provider == 'gcs' and self.gcs_client:
+            return self._list_gcs_files(prefix, page_size)
+        else:
+            return self._list_local_files(prefix)
+    
     def delete_file(self, filename: str) -> bool:
         """Delete file from cloud storage"""
         
@@ -146,17 +220,74 @@ class CloudStorageManager:
             logging.error(f"Delete failed: {e}")
             return False
     
+    # Batch operations
+    def _run_batch(self, func: Callable, items: List, max_workers: Optional[int] = None) -> List:
+        """Apply `func` to each item on a bounded thread pool, keeping input order"""
+        if not items:
+            return []
+        workers = min(max_workers or self.max_workers, len(items))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            return list(pool.map(func, items))
+    
+    def upload_many(self, items: Dict[str, Dict[Any, Any]], codec: Optional[str] = None,
+                    max_workers: Optional[int] = None) -> Dict[str, bool]:
+        """
+        Upload several objects concurrently
+        
+        Args:
+            items: Mapping of object name to data
+            codec: Serialization to use (defaults to CLOUD_STORAGE_CODEC)
+            max_workers: Concurrent uploads (defaults to CLOUD_STORAGE_MAX_WORKERS)
+            
+        Returns:
+            Mapping of object name to upload success
+        """
+        names = list(items)
+        results = self._run_batch(lambda name: self.upload_data(items[name], name, codec=codec), names, max_workers)
+        logging.info(f"Uploaded {sum(results)}/{len(names)} objects")
+        return dict(zip(names, results))
+    
+    def download_many(self, filenames: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, Optional[Dict[Any, Any]]]:
+        """
+        Download several objects concurrently
+        
+        Returns:
+            Mapping of object name to its data (None if missing or unreadable)
+        """
+        names = list(filenames)
+        return dict(zip(names, self._run_batch(self.download_data, names, max_workers)))
+    
+    def delete_many(self, filenames: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, bool]:
+        """
+        Delete several objects concurrently
+        
+        S3 deletes up to 1000 keys per request; other providers delete one
+        object per call across the thread pool.
+        
+        Returns:
+            Mapping of object name to delete success
+        """
+        names = list(filenames)
+        if self.provider == 'aws' and self.aws_client:
+            batches = [names[i:i + S3_DELETE_BATCH] for i in range(0, len(names), S3_DELETE_BATCH)]
+            results = {}
+            for batch_result in self._run_batch(self._delete_batch_from_s3, batches, max_workers):
+                results.update(batch_result)
+            return {name: results.get(name, False) for name in names}
+        return dict(zip(names, self._run_batch(self.delete_file, names, max_workers)))
+    
     # AWS S3 Methods
-    def _upload_to_s3(self, data: Dict[Any, Any], filename: str, content_type: str) -> bool:
+    def _upload_to_s3(self, data: Dict[Any, Any], filename: str, content_type: str, codec: Codec) -> bool:
         try:
-            json_data = json.dumps(data, indent=2)
-            self.aws_client.put_object(
-                Bucket=self.bucket_name,
-                Key=filename,
-                Body=json_data,
-                ContentType=content_type
-            )
-            logging.info(f"Uploaded {filename} to S3")
+            with self._encode(data, codec) as body:
+                self.aws_client.upload_fileobj(
+                    body,
+                    self.bucket_name,
+                    filename,
+                    ExtraArgs={'ContentType': content_type},
+                    Config=self.s3_transfer_config
+                )
+            logging.info(f"Uploaded {filename} to S3 ({codec.name})")
             return True
         except Exception as e:
             logging.error(f"S3 upload error: {e}")
@@ -164,22 +295,22 @@ class CloudStorageManager:
     
     def _download_from_s3(self, filename: str) -> Optional[Dict[Any, Any]]:
         try:
-            response = self.aws_client.get_object(Bucket=self.bucket_name, Key=filename)
-            content = response['Body'].read().decode('utf-8')
-            return json.loads(content)
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+                self.aws_client.download_fileobj(self.bucket_name, filename, body, Config=self.s3_transfer_config)
+                body.seek(0)
+                return decode_stream(body, filename)
         except ClientError as e:
-            if e.response['Error']['Code'] == 'NoSuchKey':
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
                 logging.warning(f"File {filename} not found in S3")
                 return None
             raise
     
-    def _list_s3_files(self, prefix: str) -> list:
-        try:
-            response = self.aws_client.list_objects_v2(Bucket=self.bucket_name, Prefix=prefix)
-            return [obj['Key'] for obj in response.get('Contents', [])]
-        except Exception as e:
-            logging.error(f"S3 list error: {e}")
-            return []
+    def _list_s3_files(self, prefix: str, page_size: int) -> Iterator[str]:
+        paginator = self.aws_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, PaginationConfig={'PageSize': page_size})
+        for page in pages:
+            for obj in page.get('Contents', []):
+                yield obj['Key']
     
     def _delete_from_s3(self, filename: str) -> bool:
         try:
@@ -190,15 +321,38 @@ class CloudStorageManager:
             logging.error(f"S3 delete error: {e}")
             return False
     
+    def _delete_batch_from_s3(self, filenames: List[str]) -> Dict[str, bool]:
+        try:
+            response = self.aws_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': name} for name in filenames], 'Quiet': True}
+            )
+            failed = {error['Key'] for error in response.get('Errors', [])}
+            for error in response.get('Errors', []):
+                logging.error(f"S3 delete error for {error['Key']}: {error.get('Message')}")
+            logging.info(f"Deleted {len(filenames) - len(failed)} objects from S3")
+            return {name: name not in failed for name in filenames}
+        except Exception as e:
+            logging.error(f"S3 batch delete error: {e}")
+            return {name: False for name in filenames}
+    
     # Azure Blob Storage Methods
-    def _upload_to_azure(self, data: Dict[Any, Any], filename: str, content_type: str) -> bool:
+    def _upload_to_azure(self, data: Dict[Any, Any], filename: str, content_type: str, codec: Codec) -> bool:
         try:
-            json_data = json.dumps(data, indent=2)
             blob_client = self.azure_client.get_blob_client(
                 container=self.bucket_name, blob=filename
             )
-            blob_client.upload_blob(json_data, content_type=content_type, overwrite=True)
-            logging.info(f"Uploaded {filename} to Azure Blob Storage")
+            with self._encode(data, codec) as body:
+                length = body.seek(0, os.SEEK_END)
+                body.seek(0)
+                blob_client.upload_blob(
+                    body,
+                    length=length,
+                    content_settings=ContentSettings(content_type=content_type),
+                    overwrite=True,
+                    max_concurrency=self.max_workers
+                )
+            logging.info(f"Uploaded {filename} to Azure Blob Storage ({codec.name})")
             return True
         except Exception as e:
             logging.error(f"Azure upload error: {e}")
@@ -209,20 +363,20 @@ class CloudStorageManager:
             blob_client = self.azure_client.get_blob_client(
                 container=self.bucket_name, blob=filename
             )
-            content = blob_client.download_blob().readall().decode('utf-8')
-            return json.loads(content)
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+                blob_client.download_blob(max_concurrency=self.max_workers).readinto(body)
+                body.seek(0)
+                return decode_stream(body, filename)
         except ResourceNotFoundError:
             logging.warning(f"File {filename} not found in Azure Blob Storage")
             return None
     
-    def _list_azure_files(self, prefix: str) -> list:
-        try:
-            container_client = self.azure_client.get_container_client(self.bucket_name)
-            blobs = container_client.list_blobs(name_starts_with=prefix)
-            return [blob.name for blob in blobs]
-        except Exception as e:
-            logging.error(f"Azure list error: {e}")
-            return []
+    def _list_azure_files(self, prefix: str, page_size: int) -> Iterator[str]:
+        container_client = self.azure_client.get_container_client(self.bucket_name)
+        pages = container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size).by_page()
+        for page in pages:
+            for blob in page:
+                yield blob.name
     
     def _delete_from_azure(self, filename: str) -> bool:
         try:
@@ -237,13 +391,20 @@ class CloudStorageManager:
             return False
     
     # Google Cloud Storage Methods
-    def _upload_to_gcs(self, data: Dict[Any, Any], filename: str, content_type: str) -> bool:
+    def _gcs_chunk_size(self) -> int:
+        # Large objects go up as a resumable upload in chunks of this size
+        return max(self.multipart_chunksize // GCS_CHUNK_UNIT, 1) * GCS_CHUNK_UNIT
+    
+    def _upload_to_gcs(self, data: Dict[Any, Any], filename: str, content_type: str, codec: Codec) -> bool:
         try:
-            json_data = json.dumps(data, indent=2)
             bucket = self.gcs_client.bucket(self.bucket_name)
             blob = bucket.blob(filename)
-            blob.upload_from_string(json_data, content_type=content_type)
-            logging.info(f"Uploaded {filename} to Google Cloud Storage")
+            with self._encode(data, codec) as body:
+                if body.seek(0, os.SEEK_END) > self.multipart_threshold:
+                    blob.chunk_size = self._gcs_chunk_size()
+                body.seek(0)
+                blob.upload_from_file(body, content_type=content_type, rewind=True)
+            logging.info(f"Uploaded {filename} to Google Cloud Storage ({codec.name})")
             return True
         except Exception as e:
             logging.error(f"GCS upload error: {e}")
@@ -252,21 +413,20 @@ class CloudStorageManager:
     def _download_from_gcs(self, filename: str) -> Optional[Dict[Any, Any]]:
         try:
             bucket = self.gcs_client.bucket(self.bucket_name)
-            blob = bucket.blob(filename)
-            content = blob.download_as_text()
-            return json.loads(content)
+            blob = bucket.blob(filename, chunk_size=self._gcs_chunk_size())
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as body:
+                blob.download_to_file(body)
+                body.seek(0)
+                return decode_stream(body, filename)
         except NotFound:
             logging.warning(f"File {filename} not found in Google Cloud Storage")
             return None
     
-    def _list_gcs_files(self, prefix: str) -> list:
-        try:
-            bucket = self.gcs_client.bucket(self.bucket_name)
-            blobs = bucket.list_blobs(prefix=prefix)
-            return [blob.name for blob in blobs]
-        except Exception as e:
-            logging.error(f"GCS list error: {e}")
-            return []
+    def _list_gcs_files(self, prefix: str, page_size: int) -> Iterator[str]:
+        blobs = self.gcs_client.list_blobs(self.bucket_name, prefix=prefix, page_size=page_size)
+        for page in blobs.pages:
+            for blob in page:
+                yield blob.name
     
     def _delete_from_gcs(self, filename: str) -> bool:
         try:
@@ -280,13 +440,37 @@ class CloudStorageManager:
             return False
     
     # Local storage methods (fallback)
-    def _upload_local(self, data: Dict[Any, Any], filename: str) -> bool:
+    def _local_path(self, filename: str) -> str:
+        """
+        Resolve an object key to a file inside the local storage directory
+
+        Raises:
+            ValueError: If the key is absolute or resolves outside local_dir
+                        (e.g. through '..' components or symlinks)
+        """
+        root = os.path.realpath(self.local_dir)
+        filepath = os.path.realpath(os.path.join(root, filename))
+        if os.path.isabs(filename) or os.path.commonpath([root, filepath]) != root or filepath == root:
+            raise ValueError(f"Key {filename!r} is outside the local storage directory")
+        return filepath
+
+    def _upload_local(self, data: Dict[Any, Any], filename: str, codec: Codec) -> bool:
         try:
-            os.makedirs('cloud_storage', exist_ok=True)
-            filepath = os.path.join('cloud_storage', filename)
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
-            logging.info(f"Uploaded {filename} to local storage")
+            filepath = self._local_path(filename)
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            # Encode straight into a temporary file next to the target, then
+            # swap it in so readers never see a partial upload
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix='.upload-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    codec.encode(data, f)
+                # mkstemp creates the file as 0600
+                os.chmod(tmp_path, 0o666 & ~_UMASK)
+                os.replace(tmp_path, filepath)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            logging.info(f"Uploaded {filename} to local storage ({codec.name})")
             return True
         except Exception as e:
             logging.error(f"Local upload error: {e}")
@@ -294,29 +478,30 @@ class CloudStorageManager:
     
     def _download_local(self, filename: str) -> Optional[Dict[Any, Any]]:
         try:
-            filepath = os.path.join('cloud_storage', filename)
+            filepath = self._local_path(filename)
             if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
-                    return json.load(f)
+                with open(filepath, 'rb') as f:
+                    return decode_stream(f, filename)
             return None
         except Exception as e:
             logging.error(f"Local download error: {e}")
             return None
     
-    def _list_local_files(self, prefix: str) -> list:
-        try:
-            cloud_dir = 'cloud_storage'
-            if os.path.exists(cloud_dir):
-                files = os.listdir(cloud_dir)
-                return [f for f in files if f.startswith(prefix)]
-            return []
-        except Exception as e:
-            logging.error(f"Local list error: {e}")
-            return []
+    def _list_local_files(self, prefix: str) -> Iterator[str]:
+        # Names are paths relative to the storage directory with '/' separators,
+        # like object keys; in-progress uploads are hidden
+        for root, dirs, files in os.walk(self.local_dir):
+            dirs.sort()
+            relative = os.path.relpath(root, self.local_dir)
+            relative = '' if relative == '.' else relative.replace(os.sep, '/') + '/'
+            for name in sorted(files):
+                key = relative + name
+                if not name.startswith('.upload-') and key.startswith(prefix):
+                    yield key
     
     def _delete_local(self, filename: str) -> bool:
         try:
-            filepath = os.path.join('cloud_storage', filename)
+            filepath = self._local_path(filename)
             if os.path.exists(filepath):
                 os.remove(filepath)
                 logging.info(f"Deleted {filename} from local storage")
@@ -1,10 +1,56 @@
 ## FIXED_FLASK_INTEGRATION
-from flask import Flask, send_from_directory, jsonify, request
-import os, json
+from flask import Flask, Response, send_from_directory, jsonify, request, stream_with_context
+import os, json, atexit, threading, uuid
+
+from blockchain import Blockchain
+from chain_export import FORMATS, block_range, iter_export
+from chain_snapshot import backup_chain, check_snapshot_name
+from chain_store import ChainStore
+from mempool import DuplicateTransactionError
+
+from jackknife import binary_jackknife_variance
+from monte import (DEFAULT_CHUNK_SIZE, DEFAULT_MAX_RUNS, adaptive_monte_carlo, batched_monte_carlo,
+                   importance_sampling_monte_carlo, iter_monte_carlo)
+from nakamoto import nakamoto_success_probability
+from sim_cache import simulation_cache
+from sweep import MAX_SWEEP_RACES, expand_range, iter_sweep
 
 # Set static_folder if you use a 'static' directory for your front-end assets
 app = Flask(__name__, static_folder='static', static_url_path='')
 
+# Node state. With CHAIN_STORE_PATH set, blocks are persisted to an
+# append-only store in that directory and survive restarts.
+chain_store = ChainStore(os.environ['CHAIN_STORE_PATH']) if os.environ.get('CHAIN_STORE_PATH') else None
+if chain_store is not None:
+    atexit.register(chain_store.close)
+# DIFFICULTY_BITS (fractional leading zero bits) overrides DIFFICULTY_PREFIX;
+# TARGET_BLOCK_TIME (seconds) turns on retargeting every RETARGET_INTERVAL
+# blocks, by at most MAX_RETARGET_FACTOR per window.
+blockchain = Blockchain(
+    difficulty_prefix=os.environ.get('DIFFICULTY_PREFIX', '0000'),
+    difficulty_bits=float(os.environ['DIFFICULTY_BITS']) if os.environ.get('DIFFICULTY_BITS') else None,
+    target_block_time=float(os.environ['TARGET_BLOCK_TIME']) if os.environ.get('TARGET_BLOCK_TIME') else None,
+    retarget_interval=int(os.environ.get('RETARGET_INTERVAL', 10)),
+    max_retarget_factor=float(os.environ.get('MAX_RETARGET_FACTOR', 4.0)),
+    store=chain_store,
+    max_block_size=int(os.environ['MAX_BLOCK_SIZE']) if os.environ.get('MAX_BLOCK_SIZE') else None,
+)
+MINER_WORKERS = int(os.environ.get('MINER_WORKERS', 1))
+# The mempool version restarts at 0 with the process, so ETags carry a
+# per-process nonce to keep a restarted node from matching stale ones.
+ETAG_NONCE = uuid.uuid4().hex[:8]
+# A proof is only valid on the tip it was mined against, so concurrent /mine
+# requests (threaded servers) take turns from reading the tip to appending.
+mining_lock = threading.Lock()
+# Process pools sized by a request never exceed the machine's cores
+MAX_WORKERS = os.cpu_count() or 1
+
+def _worker_count(value, default):
+    workers = int(value) if value is not None else default
+    if workers <= 0:
+        raise ValueError('workers must be positive')
+    return min(workers, MAX_WORKERS)
+
 @app.route('/')
 def index():
     # Serve index.html from static folder if present; otherwise from project root
@@ -55,6 +101,355 @@ def contract_info():
     # fallback
     return jsonify({'abi': None, 'address': None})
 
+@app.route('/transactions/new', methods=['POST'])
+def new_transaction():
+    values = request.get_json(silent=True) or {}
+    missing = [k for k in ('sender', 'recipient', 'amount') if values.get(k) in (None, '')]
+    if missing:
+        return jsonify({'error': f"missing fields: {', '.join(missing)}"}), 400
+    try:
+        index = blockchain.new_transaction(
+            values['sender'], values['recipient'], values['amount'],
+            id=values.get('id'), ratings=values.get('ratings'), description=values.get('description', ''),
+            status=values.get('status', 'pending'), category=values.get('category', ''),
+        )
+    except DuplicateTransactionError as e:
+        return jsonify({'error': 'duplicate transaction', 'detail': str(e)}), 409
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'invalid transaction', 'detail': str(e)}), 400
+    return jsonify({'message': f'Transaction will be added to Block {index}'}), 201
+
+# Accepts a JSON list of transactions (or {"transactions": [...]}) in one request.
+@app.route('/transactions/bulk', methods=['POST'])
+def new_transactions_bulk():
+    values = request.get_json(silent=True)
+    records = values.get('transactions') if isinstance(values, dict) else values
+    if not isinstance(records, list):
+        return jsonify({'error': 'expected a list of transactions'}), 400
+    result = blockchain.new_transactions(records)
+    result['pending'] = len(blockchain.mempool)
+    return jsonify(result), 201 if result['accepted'] else 200
+
+@app.route('/mine', methods=['GET'])
+def mine():
+    with mining_lock:
+        last_block = blockchain.last_block
+        proof = blockchain.proof_of_work(last_block.proof, last_block.hash, workers=MINER_WORKERS)
+        block = blockchain.new_block(proof, miner=request.args.get('miner', 'node'))
+        stats = blockchain.last_mining_stats
+    return jsonify({
+        'message': 'New block forged',
+        'block': block.to_dict(),
+        'mining': stats,
+    })
+
+@app.route('/transactions/<tx_id>', methods=['GET'])
+def get_transaction(tx_id):
+    tx = blockchain.get_transaction(int(tx_id) if tx_id.lstrip('-').isdigit() else tx_id)
+    if tx is None:
+        return jsonify({'error': 'transaction not found'}), 404
+    return jsonify(tx)
+
+@app.route('/transactions', methods=['GET'])
+def transactions_by_category():
+    category = request.args.get('category')
+    if category is None:
+        return jsonify({'error': 'category is required'}), 400
+    transactions = blockchain.transactions_by_category(category)
+    return jsonify({'category': category, 'count': len(transactions), 'transactions': transactions})
+
+@app.route('/address/<address>', methods=['GET'])
+def address_info(address):
+    try:
+        transactions = blockchain.transactions_for_address(address, request.args.get('role', 'any'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'address': address,
+        'balance': blockchain.balance(address),
+        'count': len(transactions),
+        'transactions': transactions,
+    })
+
+# Blocks can be paged with `from` (first block index, 1-based) and `limit`,
+# or fetched as a delta with `since_index` (blocks after that index). Pages are
+# assembled from each block's cached JSON, and an ETag lets clients skip
+# unchanged pages with If-None-Match.
+@app.route('/chain', methods=['GET'])
+def full_chain():
+    try:
+        since_index = request.args.get('since_index', type=int)
+        start = since_index + 1 if since_index is not None else request.args.get('from', 1, type=int)
+        limit = request.args.get('limit', type=int)
+        if start < 1 or (limit is not None and limit < 0):
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'from must be >= 1 and limit >= 0'}), 400
+
+    length = len(blockchain.chain)
+    stop = length if limit is None else min(length, start - 1 + limit)
+    last_hash = blockchain.last_block.hash
+    etag = f'{ETAG_NONCE}-{length}-{last_hash[:16]}-{blockchain.mempool_version}-{start}-{stop}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    meta = {
+        'length': length,
+        'from': start,
+        'count': max(stop - start + 1, 0),
+        'next': stop + 1 if stop < length else None,
+        'mempool': [t.to_dict() for t in blockchain.current_transactions],
+        'difficulty_prefix': blockchain.difficulty_prefix,
+        'difficulty_bits': blockchain.difficulty_bits,
+    }
+    blocks = b','.join(blockchain.block_json(position) for position in range(start - 1, stop))
+    body = json.dumps(meta)[:-1].encode() + b', "chain": [' + blocks + b']}'
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+# Re-verifies blocks added since the last checkpoint; full=1 checks the whole
+# chain again. GET only reports; POST also records the last block as a
+# checkpoint when the chain is valid, so later validations start after it.
+@app.route('/chain/validate', methods=['GET', 'POST'])
+def validate_chain():
+    full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+    try:
+        workers = _worker_count(request.args.get('workers'), MINER_WORKERS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(blockchain.validate(workers=workers, use_checkpoints=not full, checkpoint=request.method == 'POST'))
+
+# Incremental backup: only segments with new blocks are uploaded.
+@app.route('/chain/backup', methods=['POST'])
+def backup():
+    values = request.get_json(silent=True) or {}
+    try:
+        name = check_snapshot_name(values.get('name', 'chain'))
+        result = backup_chain(blockchain, name=name, codec=values.get('codec', 'json+gzip'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), 200 if result['success'] else 502
+
+def _export_response(fmt):
+    try:
+        # `from`/`to` are inclusive 1-based block indexes, like /chain's `from`
+        first, last = request.args.get('from'), request.args.get('to')
+        start, stop = block_range(int(first) if first is not None else None, int(last) if last is not None else None)
+        chunks = iter_export(blockchain, fmt, start, stop)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    mimetype, extension = FORMATS[fmt]
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=chain_transactions.{extension}'},
+    )
+
+# Exports stream block by block, so memory use does not grow with the chain.
+@app.route('/export_csv', methods=['GET'])
+def export_csv():
+    return _export_response('csv')
+
+@app.route('/export', methods=['GET'])
+def export():
+    return _export_response(request.args.get('format', 'csv').lower())
+
+def _simulation_params(source):
+    attack_power = float(source.get('attack_power', 30))
+    confirmation_blocks = int(source.get('confirmation_blocks', 6))
+    runs = int(source.get('runs', 1000))
+    if not 0 <= attack_power <= 100 or confirmation_blocks < 0 or not 0 < runs <= DEFAULT_MAX_RUNS:
+        raise ValueError(f'attack_power must be 0-100, confirmation_blocks >= 0 and runs 1-{DEFAULT_MAX_RUNS}')
+    seed = source.get('seed')
+    seed = int(seed) if seed is not None else None
+    if seed is not None and seed < 0:
+        raise ValueError('seed must be non-negative')
+    return attack_power, confirmation_blocks, runs, seed
+
+def run_simulation(method, attack_power, confirmation_blocks, runs, seed=None,
+                   target_relative_error=None, max_runs=DEFAULT_MAX_RUNS, confidence=0.95):
+    if method == 'nakamoto':
+        probability = nakamoto_success_probability(attack_power, confirmation_blocks)
+        return {'method': method, 'success_probability': probability * 100}
+
+    if method == 'monte-carlo':
+        # With a target relative error the run count is chosen adaptively
+        # (up to max_runs) instead of using `runs`.
+        if target_relative_error is not None:
+            result = adaptive_monte_carlo(attack_power, confirmation_blocks, target_relative_error,
+                                          confidence=confidence, rng=seed, max_runs=max_runs)
+        else:
+            result = batched_monte_carlo(attack_power, confirmation_blocks, runs, rng=seed,
+                                         confidence=confidence)
+        response = {
+            'method': method,
+            'success_probability': result['success_rate'] * 100,
+            'standard_error': result['standard_error'] * 100,
+            'ci_low': result['ci_low'] * 100,
+            'ci_high': result['ci_high'] * 100,
+            'runs': result['runs'],
+        }
+        if target_relative_error is not None:
+            response['converged'] = result['converged']
+        return response
+
+    if method == 'importance-sampling':
+        result = importance_sampling_monte_carlo(attack_power, confirmation_blocks, max(runs, 2), rng=seed,
+                                                 confidence=confidence)
+        return {
+            'method': method,
+            'success_probability': result['success_rate'] * 100,
+            'standard_error': result['standard_error'] * 100,
+            'ci_low': result['ci_low'] * 100,
+            'ci_high': result['ci_high'] * 100,
+            'relative_error': result['relative_error'],
+            'runs': result['runs'],
+        }
+
+    if method == 'jackknife':
+        # Race outcomes are 0/1, so the jackknife variance follows from the
+        # success count without materializing one entry per run.
+        result = batched_monte_carlo(attack_power, confirmation_blocks, runs, rng=seed)
+        # Reported in percent like the other methods (variance in percent squared).
+        variance = binary_jackknife_variance(result['successes'], runs) if runs > 1 else 0.0
+        return {
+            'method': method,
+            'jackknife_estimation': {
+                'estimate': result['success_rate'] * 100,
+                'variance': variance * 100 ** 2,
+                'standard_error': variance ** 0.5 * 100,
+                'runs': runs,
+            },
+        }
+
+    raise ValueError(f'unknown method {method!r}')
+
+@app.route('/simulate', methods=['POST'])
+def simulate():
+    params = request.get_json(silent=True) or {}
+    try:
+        attack_power, confirmation_blocks, runs, seed = _simulation_params(params)
+        target_relative_error = params.get('target_relative_error')
+        if target_relative_error is not None:
+            target_relative_error = float(target_relative_error)
+        max_runs = min(int(params.get('max_runs', DEFAULT_MAX_RUNS)), DEFAULT_MAX_RUNS)
+        confidence = float(params.get('confidence', 0.95))
+        if not 0 < confidence < 1:
+            raise ValueError('confidence must be between 0 and 1')
+        method = str(params.get('method', 'monte-carlo')).strip().lower()
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'invalid simulation parameters', 'detail': str(e)}), 400
+
+    # Identical requests are served from the result cache; `fresh` forces a
+    # new run. The analytic method does not depend on runs or seed.
+    key_params = {'method': method, 'attack_power': attack_power, 'confirmation_blocks': confirmation_blocks}
+    if method != 'nakamoto':
+        key_params.update(runs=runs, seed=seed, target_relative_error=target_relative_error,
+                          max_runs=max_runs if target_relative_error is not None else None,
+                          confidence=confidence)
+    try:
+        result = simulation_cache.get_or_compute(
+            'simulate', key_params,
+            lambda: run_simulation(method, attack_power, confirmation_blocks, runs, seed,
+                                   target_relative_error, max_runs, confidence),
+            bypass=bool(params.get('fresh', False)),
+        )
+        return jsonify(result)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'invalid simulation parameters', 'detail': str(e)}), 400
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+# Progressive Monte Carlo results as Server-Sent Events. A `progress` event is
+# sent every `report_every` chunks and a final `done` event when all runs have
+# completed or the confidence interval is narrower than `tolerance` (in
+# percentage points, like the reported probabilities).
+@app.route('/simulate/stream', methods=['GET'])
+def simulate_stream():
+    try:
+        attack_power, confirmation_blocks, runs, seed = _simulation_params(request.args)
+        # Each chunk is simulated in one array, so its size is capped like the
+        # batched estimators' default
+        chunk_size = min(int(request.args.get('chunk_size', max(runs // 20, 1000))), DEFAULT_CHUNK_SIZE)
+        report_every = max(int(request.args.get('report_every', 1)), 1)
+        tolerance = request.args.get('tolerance', type=float)
+        if chunk_size <= 0:
+            raise ValueError('chunk_size must be positive')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'invalid simulation parameters', 'detail': str(e)}), 400
+
+    def progress(result, **extra):
+        return {
+            'success_probability': result['success_rate'] * 100,
+            'standard_error': result['standard_error'] * 100,
+            'ci_low': result['ci_low'] * 100,
+            'ci_high': result['ci_high'] * 100,
+            'ci_width': (result['ci_high'] - result['ci_low']) * 100,
+            'runs_completed': result['runs'],
+            'runs': runs,
+            **extra,
+        }
+
+    def generate():
+        stopped_early = False
+        for chunk, result in enumerate(iter_monte_carlo(attack_power, confirmation_blocks, runs,
+                                                        rng=seed, chunk_size=chunk_size), 1):
+            if tolerance is not None and (result['ci_high'] - result['ci_low']) * 100 <= tolerance:
+                stopped_early = result['runs'] < runs
+                break
+            if chunk % report_every == 0:
+                yield _sse('progress', progress(result))
+        yield _sse('done', progress(result, stopped_early=stopped_early))
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(simulation_cache.stats())
+
+# Attack power x confirmations sweep. Rows are streamed back as
+# newline-delimited JSON as soon as each one finishes.
+@app.route('/simulate/sweep', methods=['POST'])
+def simulate_sweep():
+    params = request.get_json(silent=True) or {}
+    try:
+        attack_powers = [float(a) for a in expand_range(params.get('attack_power', {'start': 0, 'stop': 50, 'step': 5}))]
+        confirmations = [int(z) for z in expand_range(params.get('confirmation_blocks', {'start': 0, 'stop': 10}))]
+        runs = int(params.get('runs', 10000))
+        seed = int(params['seed']) if params.get('seed') is not None else None
+        max_workers = _worker_count(params.get('workers'), MAX_WORKERS)
+        if not 0 < runs <= DEFAULT_MAX_RUNS:
+            raise ValueError(f'runs must be between 1 and {DEFAULT_MAX_RUNS}')
+        if seed is not None and seed < 0:
+            raise ValueError('seed must be non-negative')
+        if not all(0 <= a <= 100 for a in attack_powers) or not all(z >= 0 for z in confirmations):
+            raise ValueError('attack_power must be 0-100 and confirmation_blocks >= 0')
+        if len(attack_powers) * len(confirmations) * runs > MAX_SWEEP_RACES:
+            raise ValueError(f'grid cells x runs must be at most {MAX_SWEEP_RACES}')
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': 'invalid sweep parameters', 'detail': str(e)}), 400
+    if not attack_powers or not confirmations:
+        return jsonify({'error': 'invalid sweep parameters'}), 400
+
+    def generate():
+        yield json.dumps({'attack_powers': attack_powers, 'confirmations': confirmations, 'runs': runs}) + '\n'
+        for row, attack_power, results in iter_sweep(attack_powers, confirmations, runs, seed, max_workers):
+            yield json.dumps({
+                'row': row,
+                'attack_power': attack_power,
+                'success_rate': [r['success_rate'] for r in results],
+                'standard_error': [r['standard_error'] for r in results],
+            }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5501))
     # Run Flask for backend. Use this alongside your VS Code Live Server (frontend).
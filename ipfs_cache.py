@@ -0,0 +1,251 @@
+"""
+IPFS Content Cache
+Content-addressed on-disk cache for IPFS retrievals with an in-memory hot tier
+"""
+
+import os
+import re
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Only plain CIDs are used as file names
+_CID_PATTERN = re.compile(r'^[A-Za-z0-9]{8,128}$')
+_DIGEST_SIZE = 32
+# CIDv1 header for raw-codec content hashed with sha2-256: version 1,
+# codec 0x55, multihash function 0x12, digest length 32
+_RAW_SHA256_PREFIX = bytes([0x01, 0x55, 0x12, 0x20])
+
+
+def cid_digest(cid: str) -> Optional[bytes]:
+    """
+    SHA-256 digest a CID commits the raw content to, if it is verifiable
+
+    Only base32 CIDv1 with the raw codec and a sha2-256 multihash ("bafkrei...")
+    hash the content bytes directly. Other CIDs (CIDv0 "Qm...", dag-pb/UnixFS)
+    hash an encoding of the content and yield None.
+    """
+    if not cid.startswith('b'):
+        return None
+    encoded = cid[1:].upper()
+    try:
+        decoded = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except ValueError:
+        return None
+    if len(decoded) != len(_RAW_SHA256_PREFIX) + _DIGEST_SIZE or not decoded.startswith(_RAW_SHA256_PREFIX):
+        return None
+    return decoded[len(_RAW_SHA256_PREFIX):]
+
+
+class IPFSCache:
+    """
+    Cache of immutable IPFS content keyed by CID
+
+    Each entry is one file holding the SHA-256 of the content followed by the
+    content itself. The digest is checked on every disk read, so a corrupted
+    entry is dropped and fetched again instead of being served. For raw
+    sha2-256 CIDv1 the content is also checked against the CID before it is
+    cached and mismatches are refused; for any other CID the content is cached
+    as retrieved, unverified, and the digest only guards the local copy.
+
+    The disk tier is bounded by `max_bytes` with least-recently-used eviction;
+    recency survives restarts through file modification times. Decoded values
+    of the most recent `hot_entries` CIDs are also kept in memory and returned
+    as-is, so callers must treat them as read-only.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, hot_entries: int = 128,
+                 decode: Optional[Callable[[bytes], Any]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hot_entries = hot_entries
+        self.decode = decode or (lambda content: content)
+
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[str, Any]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.corrupt = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the LRU order of the disk tier from file modification times"""
+        entries = []
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and _CID_PATTERN.match(entry.name):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, cid, size in sorted(entries):
+            self._disk[cid] = size
+            self.total_bytes += size
+        logging.info(f"IPFS cache {self.path}: {len(self._disk)} entries, {self.total_bytes} bytes")
+
+    def _file(self, cid: str) -> str:
+        return os.path.join(self.path, cid[-2:], cid)
+
+    @staticmethod
+    def cacheable(cid: str) -> bool:
+        return bool(cid) and bool(_CID_PATTERN.match(cid))
+
+    def get(self, cid: str) -> Optional[Any]:
+        """
+        Look up a CID, checking memory first and then disk
+
+        Returns:
+            The decoded content, or None on a miss
+        """
+        with self._lock:
+            if cid in self._hot:
+                self._hot.move_to_end(cid)
+                self.hits += 1
+                return self._hot[cid]
+            on_disk = cid in self._disk
+
+        content = self._read(cid) if on_disk else None
+        if content is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        value = self.decode(content)
+        with self._lock:
+            self.disk_hits += 1
+            if cid in self._disk:
+                self._disk.move_to_end(cid)
+            self._remember(cid, value)
+        return value
+
+    def _read(self, cid: str) -> Optional[bytes]:
+        path = self._file(cid)
+        try:
+            with open(path, 'rb') as f:
+                digest = f.read(_DIGEST_SIZE)
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            self._forget(cid)
+            return None
+        if hashlib.sha256(content).digest() != digest:
+            logging.warning(f"IPFS cache entry {cid} failed its integrity check; dropping it")
+            with self._lock:
+                self.corrupt += 1
+            self._forget(cid, unlink=True)
+            return None
+        return content
+
+    def put(self, cid: str, content: bytes, value: Any = None):
+        """
+        Store content for a CID
+
+        Args:
+            cid: CID the content was retrieved under
+            content: Raw content bytes
+            value: Already-decoded content for the hot tier (decoded from `content` if omitted)
+        """
+        if not self.cacheable(cid):
+            return
+        size = _DIGEST_SIZE + len(content)
+        if size > self.max_bytes:
+            return
+        digest = hashlib.sha256(content).digest()
+        expected = cid_digest(cid)
+        if expected is not None and expected != digest:
+            logging.warning(f"IPFS content retrieved for {cid} does not match the CID; not caching it")
+            return
+        path = self._file(cid)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(digest)
+                    f.write(content)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            logging.error(f"IPFS cache write error for {cid}: {e}")
+            return
+
+        with self._lock:
+            self.writes += 1
+            self.total_bytes += size - self._disk.pop(cid, 0)
+            self._disk[cid] = size
+            self._remember(cid, value if value is not None else self.decode(content))
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self._disk) > 1:
+                old, old_size = self._disk.popitem(last=False)
+                self.total_bytes -= old_size
+                self._hot.pop(old, None)
+                self.evictions += 1
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.unlink(self._file(old))
+            except OSError:
+                pass
+
+    def _remember(self, cid: str, value: Any):
+        if self.hot_entries <= 0:
+            return
+        self._hot[cid] = value
+        self._hot.move_to_end(cid)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def _forget(self, cid: str, unlink: bool = False):
+        with self._lock:
+            self.total_bytes -= self._disk.pop(cid, 0)
+            self._hot.pop(cid, None)
+        if unlink:
+            try:
+                os.unlink(self._file(cid))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            cids = list(self._disk)
+            self._disk.clear()
+            self._hot.clear()
+            self.total_bytes = 0
+        for cid in cids:
+            try:
+                os.unlink(self._file(cid))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'corrupt': self.corrupt,
+                'hot_entries': len(self._hot),
+                'disk_entries': len(self._disk),
+                'disk_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -2,19 +2,93 @@
 
 import numpy as np
 
-def jackknife_estimation(data):
-    n = len(data)
-    estimates = np.zeros(n)
 
-    for i in range(n):
-        leave_one_out = np.delete(data, i)
-        estimates[i] = np.mean(leave_one_out)
+def _leave_one_out_means(data):
+    n = data.size
+    return (data.sum() - data) / (n - 1)
+
+
+def _leave_one_out_variances(data):
+    # Population variance (ddof=0) of each leave-one-out sample, from the
+    # running sums of x and x^2 with the left-out value removed.
+    n = data.size
+    centred = data - data.mean()
+    means = (centred.sum() - centred) / (n - 1)
+    squares = ((centred ** 2).sum() - centred ** 2) / (n - 1)
+    return squares - means ** 2
+
+
+def jackknife_estimation(data, statistic=None):
+    """Leave-one-out replicates of `statistic` (the mean by default).
 
+    The mean and `np.var` are computed in a single vectorized pass; any other
+    statistic is evaluated once per left-out sample.
+    """
+    data = np.asarray(data, dtype=float)
+    n = data.size
+    if n < 2:
+        raise ValueError("jackknife needs at least two samples")
+
+    if statistic is None or statistic is np.mean:
+        return _leave_one_out_means(data)
+    if statistic is np.var:
+        return _leave_one_out_variances(data)
+
+    estimates = np.empty(n)
+    keep = np.ones(n, dtype=bool)
+    for i in range(n):
+        keep[i] = False
+        estimates[i] = statistic(data[keep])
+        keep[i] = True
     return estimates
 
-def jackknife_variance(data):
-    n = len(data)
-    mean_estimate = np.mean(data)
-    jackknife_estimates = jackknife_estimation(data)
+
+def jackknife_variance(data, statistic=None):
+    data = np.asarray(data, dtype=float)
+    n = data.size
+    jackknife_estimates = jackknife_estimation(data, statistic)
+    mean_estimate = np.mean(jackknife_estimates)
     variance = (n - 1) * np.mean((jackknife_estimates - mean_estimate) ** 2)
-    return variance
\ No newline at end of file
+    return variance
+
+
+def binary_jackknife_variance(successes, runs):
+    """Jackknife variance of a success rate from its counts alone.
+
+    For 0/1 outcomes the leave-one-out means take only two values, so the
+    jackknife variance reduces to p(1 - p) / (n - 1) with p = successes / runs
+    and needs no per-run array.
+    """
+    if runs < 2:
+        raise ValueError("jackknife needs at least two samples")
+    rate = successes / runs
+    return rate * (1 - rate) / (runs - 1)
+
+
+def blocked_jackknife_variance(data, n_blocks=100, statistic=None):
+    """Delete-d jackknife variance with d = len(data) / n_blocks.
+
+    The data is split into `n_blocks` contiguous blocks and each replicate
+    leaves out one whole block, so only `n_blocks` replicates are needed however
+    large the sample is. Contiguous blocks also keep serially correlated
+    samples (e.g. successive simulation chunks) together.
+    """
+    data = np.asarray(data, dtype=float)
+    n = data.size
+    if n < 2:
+        raise ValueError("jackknife needs at least two samples")
+    n_blocks = min(n_blocks, n)
+    if n_blocks < 2:
+        raise ValueError("n_blocks must be at least 2")
+
+    bounds = np.linspace(0, n, n_blocks + 1).astype(np.int64)
+    if statistic is None or statistic is np.mean:
+        block_sums = np.add.reduceat(data, bounds[:-1])
+        block_sizes = np.diff(bounds)
+        estimates = (data.sum() - block_sums) / (n - block_sizes)
+    else:
+        estimates = np.empty(n_blocks)
+        for i in range(n_blocks):
+            estimates[i] = statistic(np.concatenate((data[:bounds[i]], data[bounds[i + 1]:])))
+
+    return (n_blocks - 1) * np.mean((estimates - estimates.mean()) ** 2)
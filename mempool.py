@@ -0,0 +1,121 @@
+"""
+Transaction Mempool
+Pending transactions keyed by id, with a priority heap for block selection
+"""
+
+import heapq
+import itertools
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class DuplicateTransactionError(ValueError):
+    """Raised when a transaction id is already pending or confirmed"""
+
+
+class Mempool:
+    """
+    Pending transactions awaiting a block
+
+    Transactions are held in arrival order in a dict keyed by id, so duplicate
+    detection and removal are O(1). A heap ordered by amount, then ratings
+    (both descending), then arrival selects the best transactions when a block
+    can only take some of them; entries for transactions that have left the
+    pool are skipped lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self._pending: Dict = {}
+        self._heap: List[Tuple] = []
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+        # Bumped on every change so callers can tell when a view is out of date
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, tx_id) -> bool:
+        return tx_id in self._pending
+
+    def __iter__(self) -> Iterator:
+        return iter(list(self._pending.values()))
+
+    def add(self, tx) -> bool:
+        """Add a transaction; returns False if its id is already pending"""
+        with self._lock:
+            if tx.id in self._pending:
+                return False
+            self._push(tx)
+            self.version += 1
+            return True
+
+    def add_many(self, txs: Iterable) -> Tuple[int, List]:
+        """Add transactions in one locked pass; returns (accepted count, duplicate ids)"""
+        accepted, duplicates = 0, []
+        with self._lock:
+            for tx in txs:
+                if tx.id in self._pending:
+                    duplicates.append(tx.id)
+                    continue
+                self._push(tx)
+                accepted += 1
+            if accepted:
+                self.version += 1
+        return accepted, duplicates
+
+    def _push(self, tx):
+        arrival = next(self._arrivals)
+        self._pending[tx.id] = (arrival, tx)
+        heapq.heappush(self._heap, (-tx.amount, -tx.ratings, arrival, tx.id))
+
+    def remove(self, tx_id) -> bool:
+        with self._lock:
+            if self._pending.pop(tx_id, None) is None:
+                return False
+            self.version += 1
+            return True
+
+    def take(self, limit: Optional[int] = None) -> List:
+        """
+        Remove and return transactions for the next block
+
+        Args:
+            limit: Maximum number of transactions; None takes everything
+
+        Returns:
+            All pending transactions in arrival order if they fit, otherwise
+            the top `limit` by amount and ratings, best first
+        """
+        with self._lock:
+            self.version += 1
+            if limit is None or len(self._pending) <= limit:
+                taken = [tx for _, tx in self._pending.values()]
+                self._pending.clear()
+                self._heap.clear()
+                return taken
+
+            taken = []
+            while len(taken) < limit:
+                _, _, arrival, tx_id = heapq.heappop(self._heap)
+                entry = self._pending.get(tx_id)
+                if entry is None or entry[0] != arrival:
+                    continue
+                del self._pending[tx_id]
+                taken.append(entry[1])
+            # Drop stale entries once they outnumber live ones
+            if len(self._heap) > 2 * len(self._pending):
+                self._heap = [(-tx.amount, -tx.ratings, arrival, tx.id) for arrival, tx in self._pending.values()]
+                heapq.heapify(self._heap)
+            return taken
+
+    def transactions(self) -> List:
+        """Pending transactions in arrival order"""
+        with self._lock:
+            return [tx for _, tx in self._pending.values()]
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._heap.clear()
+            self.version += 1
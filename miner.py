@@ -0,0 +1,122 @@
+# miner.py
+
+import hashlib
+import math
+import multiprocessing
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Nonces are handed out to workers in batches of this size; the stop flag is
+# checked between batches.
+DEFAULT_BATCH_SIZE = 50_000
+
+
+# Largest meaningful target: every digest is below it.
+MAX_TARGET = 1 << 256
+
+
+def target_for_bits(difficulty_bits: float) -> int:
+    """256-bit target that requires `difficulty_bits` leading zero bits.
+
+    Fractional bits are allowed and give intermediate difficulties.
+    """
+    if not 0 <= difficulty_bits <= 256:
+        raise ValueError("difficulty_bits must be between 0 and 256")
+    return max(int(2 ** (256 - difficulty_bits)), 1)
+
+
+def bits_for_target(target: int) -> float:
+    """Inverse of `target_for_bits`: log2 of the expected hashes per proof."""
+    return 256 - math.log2(target)
+
+
+def target_bytes(target: int) -> bytes:
+    """Target as bytes for comparing against raw SHA-256 digests.
+
+    A digest meets the target iff `digest < target_bytes(target)`; equal-length
+    bytes compare exactly like the big-endian integers they encode.
+    """
+    if target >= MAX_TARGET:
+        # One byte longer than a digest, so every digest sorts below it.
+        return b"\xff" * 32 + b"\x00"
+    return target.to_bytes(32, "big")
+
+
+def _search(last_proof: int, last_hash: str, target: bytes, start: int, stride: int,
+            batch_size: int, stop_event):
+    # Guess layout matches Blockchain.valid_proof: f"{last_proof}{proof}{last_hash}".
+    # The SHA-256 state after the constant prefix is computed once and copied
+    # for each nonce.
+    copy = hashlib.sha256(str(last_proof).encode()).copy
+    suffix = last_hash.encode()
+    hashes = 0
+    batch_start = start
+    while not stop_event.is_set():
+        for proof in range(batch_start, batch_start + batch_size):
+            h = copy()
+            h.update(b"%d%s" % (proof, suffix))
+            if h.digest() < target:
+                return proof, hashes + proof - batch_start + 1
+        hashes += batch_size
+        batch_start += stride
+    return None, hashes
+
+
+def _worker(last_proof, last_hash, target, start, stride, batch_size, stop_event, results):
+    proof, hashes = _search(last_proof, last_hash, target, start, stride, batch_size, stop_event)
+    if proof is not None:
+        stop_event.set()
+    results.put((proof, hashes))
+
+
+def mine(last_proof: int, last_hash: str, target: int, workers: Optional[int] = None,
+         batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Find a proof whose guess hash, read as a 256-bit integer, is below `target`
+
+    Worker w searches nonce batches w, w + workers, w + 2 * workers, ... and all
+    workers stop as soon as one of them finds a solution. With a single worker
+    the search runs in-process and returns the smallest valid proof.
+
+    Returns:
+        Dictionary with the proof, total hashes tried, elapsed seconds,
+        hashes_per_sec and the number of workers used
+    """
+    workers = workers or os.cpu_count() or 1
+    target = target_bytes(target)
+    stride = workers * batch_size
+    started = time.perf_counter()
+
+    if workers == 1:
+        proof, hashes = _search(last_proof, last_hash, target, 0, stride, batch_size, threading.Event())
+    else:
+        ctx = multiprocessing.get_context()
+        stop_event = ctx.Event()
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=_worker, daemon=True,
+                        args=(last_proof, last_hash, target, w * batch_size, stride, batch_size,
+                              stop_event, results))
+            for w in range(workers)
+        ]
+        for p in processes:
+            p.start()
+        proof, hashes = None, 0
+        for _ in processes:
+            found, worker_hashes = results.get()
+            hashes += worker_hashes
+            if proof is None and found is not None:
+                proof = found
+        for p in processes:
+            p.join()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "proof": proof,
+        "hashes": hashes,
+        "elapsed": elapsed,
+        "hashes_per_sec": hashes / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
@@ -1,15 +1,295 @@
 # monte_carlo.py
 
+import math
+from statistics import NormalDist
+
 import numpy as np
 
-def monte_carlo_simulation(attack_power, confirmation_blocks, runs):
-    success_count = 0
+# Runs are drawn in chunks of this many races so memory stays bounded
+# no matter how large `runs` is.
+DEFAULT_CHUNK_SIZE = 1 << 18
+
+# The attacker abandons a race once the honest chain is this many blocks ahead,
+# or once this many blocks have been mined after the merchant's confirmations.
+DEFAULT_MAX_DEFICIT = 20
+DEFAULT_MAX_STEPS = 10_000
+
+# Adaptive mode starts with this many runs and never exceeds the cap.
+DEFAULT_INITIAL_RUNS = 10_000
+DEFAULT_MAX_RUNS = 50_000_000
+
+
+def simulate_races(attack_power, confirmation_blocks, races, rng=None,
+                   max_deficit=DEFAULT_MAX_DEFICIT, max_steps=DEFAULT_MAX_STEPS):
+    """Run `races` independent double-spend races and return how many the attacker won.
+
+    Every block is found by the attacker with probability q = attack_power / 100
+    and by the honest network otherwise. While the merchant waits for
+    `confirmation_blocks` honest blocks the attacker mines in private, so its
+    progress is negative-binomially distributed. From then on each race is a
+    random walk on the attacker's deficit: it wins on catching up (deficit <= 0)
+    and gives up once the deficit exceeds `max_deficit` or `max_steps` blocks
+    have passed. All races advance together, one block per step.
+    """
+    rng = np.random.default_rng(rng)
+    q = attack_power / 100
+    if q <= 0:
+        return 0
+    if q >= 1 or confirmation_blocks <= 0:
+        return races
+
+    deficit = confirmation_blocks - rng.negative_binomial(confirmation_blocks, 1 - q, size=races)
+    successes = int(np.count_nonzero(deficit <= 0))
+
+    # Finished races stay in the arrays with `alive` cleared (so they stop
+    # moving) until enough of them pile up to make compacting worthwhile.
+    d = deficit[(deficit > 0) & (deficit <= max_deficit)].astype(np.int16)
+    alive = np.ones(d.size, dtype=bool)
+    n_alive = d.size
+    for _ in range(max_steps):
+        if n_alive == 0:
+            break
+        attacker_block = rng.random(d.size) < q
+        attacker_block &= alive
+        d -= attacker_block
+        d += alive & ~attacker_block
+        # 1 <= d <= max_deficit, as a single unsigned comparison.
+        alive &= (d - 1).view(np.uint16) < max_deficit
+        n_alive = int(np.count_nonzero(alive))
+        if n_alive < d.size // 2:
+            successes += int(np.count_nonzero(d <= 0))
+            d = d[alive]
+            alive = np.ones(d.size, dtype=bool)
+
+    return successes + int(np.count_nonzero(d <= 0))
+
+
+def summarize(successes, runs, confidence=0.95):
+    """Success rate, standard error and Wilson score interval for `successes` out of `runs`."""
+    rate = successes / runs if runs else 0.0
+    standard_error = math.sqrt(rate * (1 - rate) / runs) if runs else 0.0
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    if runs:
+        denom = 1 + z * z / runs
+        centre = (rate + z * z / (2 * runs)) / denom
+        half_width = z * math.sqrt(rate * (1 - rate) / runs + z * z / (4 * runs * runs)) / denom
+    else:
+        centre, half_width = 0.5, 0.5
+
+    return {
+        "success_rate": rate,
+        "standard_error": standard_error,
+        "ci_low": max(0.0, centre - half_width),
+        "ci_high": min(1.0, centre + half_width),
+        "confidence": confidence,
+        "successes": successes,
+        "runs": runs,
+    }
+
+
+def iter_monte_carlo(attack_power, confirmation_blocks, runs, rng=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, confidence=0.95,
+                     max_deficit=DEFAULT_MAX_DEFICIT):
+    """Yield the running `summarize` result after every chunk of simulated races.
+
+    Callers may stop iterating at any point (e.g. once the interval is narrow
+    enough); no further races are simulated after that.
+    """
+    if runs <= 0:
+        raise ValueError("runs must be positive")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    rng = np.random.default_rng(rng)
+
+    successes = 0
+    completed = 0
+    while completed < runs:
+        n = min(chunk_size, runs - completed)
+        successes += simulate_races(attack_power, confirmation_blocks, n, rng=rng,
+                                    max_deficit=max_deficit)
+        completed += n
+        yield summarize(successes, completed, confidence)
+
+
+def batched_monte_carlo(attack_power, confirmation_blocks, runs, rng=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, confidence=0.95,
+                        max_deficit=DEFAULT_MAX_DEFICIT):
+    """Monte Carlo estimate of the attack success rate from simulated block races.
+
+    `rng` may be a `numpy.random.Generator` or anything accepted by
+    `numpy.random.default_rng` (e.g. an integer seed) for reproducible runs.
+    """
+    for result in iter_monte_carlo(attack_power, confirmation_blocks, runs, rng=rng,
+                                   chunk_size=chunk_size, confidence=confidence,
+                                   max_deficit=max_deficit):
+        pass
+    return result
+
+
+def adaptive_monte_carlo(attack_power, confirmation_blocks, target_relative_error=0.05,
+                         confidence=0.95, rng=None, initial_runs=DEFAULT_INITIAL_RUNS,
+                         max_runs=DEFAULT_MAX_RUNS, chunk_size=DEFAULT_CHUNK_SIZE,
+                         max_deficit=DEFAULT_MAX_DEFICIT):
+    """Simulate in sequential batches until the confidence interval half-width is
+    within `target_relative_error` of the estimate, or `max_runs` is reached.
+
+    Each batch is sized from the runs the current estimate says are still
+    needed, but never more than doubles the total, so a noisy early estimate
+    cannot overshoot far. The result is the `summarize` dict plus `converged`
+    and `target_relative_error`; `runs` is the number of races actually used.
+    """
+    if target_relative_error <= 0:
+        raise ValueError("target_relative_error must be positive")
+    if initial_runs <= 0 or max_runs <= 0:
+        raise ValueError("initial_runs and max_runs must be positive")
+    initial_runs = min(initial_runs, max_runs)
+
+    rng = np.random.default_rng(rng)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    successes = 0
+    runs = 0
+    batch = initial_runs
+    while True:
+        batch = min(batch, max_runs - runs)
+        while batch > 0:
+            n = min(chunk_size, batch)
+            successes += simulate_races(attack_power, confirmation_blocks, n, rng=rng,
+                                        max_deficit=max_deficit)
+            runs += n
+            batch -= n
+
+        result = summarize(successes, runs, confidence)
+        rate = result["success_rate"]
+        half_width = (result["ci_high"] - result["ci_low"]) / 2
+        converged = successes > 0 and half_width <= target_relative_error * rate
+        if converged or runs >= max_runs:
+            break
+
+        if successes:
+            needed = z * z * (1 - rate) / (rate * target_relative_error ** 2)
+            batch = int(min(max(needed - runs, initial_runs), runs))
+        else:
+            batch = runs
+
+    result["converged"] = converged
+    result["target_relative_error"] = target_relative_error
+    return result
+
+
+def _weighted_races(attack_power, confirmation_blocks, races, rng, confirmation_tilt,
+                    race_tilt, max_deficit, max_steps):
+    # Same race as `simulate_races`, but blocks are drawn with tilted attacker
+    # shares and every race carries its log likelihood ratio.
+    q = attack_power / 100
+    z = confirmation_blocks
+
+    def log_ratios(tilted_attack_power):
+        tilted_q = tilted_attack_power / 100
+        return math.log(q / tilted_q), math.log((1 - q) / (1 - tilted_q))
+
+    log_attacker, log_honest = log_ratios(confirmation_tilt)
+    attacker_blocks = rng.negative_binomial(z, 1 - confirmation_tilt / 100, size=races)
+    deficit = z - attacker_blocks
+    log_weight = attacker_blocks * log_attacker + z * log_honest
+    weights = [np.exp(log_weight[deficit <= 0])]
+
+    log_attacker, log_honest = log_ratios(race_tilt)
+    tilted_q = race_tilt / 100
+    racing = (deficit > 0) & (deficit <= max_deficit)
+    d = deficit[racing].astype(np.int16)
+    log_weight = log_weight[racing]
+    alive = np.ones(d.size, dtype=bool)
+    n_alive = d.size
+    for _ in range(max_steps):
+        if n_alive == 0:
+            break
+        attacker_block = rng.random(d.size) < tilted_q
+        attacker_block &= alive
+        honest_block = alive & ~attacker_block
+        d -= attacker_block
+        d += honest_block
+        log_weight += attacker_block * log_attacker
+        log_weight += honest_block * log_honest
+        alive &= (d - 1).view(np.uint16) < max_deficit
+        n_alive = int(np.count_nonzero(alive))
+        if n_alive < d.size // 2:
+            weights.append(np.exp(log_weight[d <= 0]))
+            d, log_weight = d[alive], log_weight[alive]
+            alive = np.ones(d.size, dtype=bool)
+    weights.append(np.exp(log_weight[d <= 0]))
+
+    weights = np.concatenate(weights)
+    return float(weights.sum()), float(np.dot(weights, weights))
+
+
+def importance_sampling_monte_carlo(attack_power, confirmation_blocks, runs, rng=None,
+                                    confirmation_tilt=None, race_tilt=None,
+                                    chunk_size=DEFAULT_CHUNK_SIZE, confidence=0.95,
+                                    max_deficit=DEFAULT_MAX_DEFICIT, max_steps=DEFAULT_MAX_STEPS):
+    """Importance-sampling estimate of the attack success rate for rare events.
+
+    Races are simulated with the attacker's block share tilted and each success
+    is weighted by the likelihood ratio (q/q')^a (p/p')^h of its a attacker and
+    h honest blocks. While the merchant waits for confirmations the share is
+    tilted to `confirmation_tilt` (default 50, which centres the attacker's
+    private lead on the confirmation count); during the catch-up race it is
+    tilted to `race_tilt` (default the honest share, i.e. p and q swapped, the
+    optimal exponential tilt for this random walk). Both are attack powers in
+    percent. At low attack power this turns an event seen once in billions of
+    plain runs into one seen in most runs. Returns the same keys as
+    `summarize` (with a normal-approximation interval) plus `relative_error`
+    (None when the estimate is 0).
+    """
+    if runs <= 1:
+        raise ValueError("runs must be greater than 1")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    q = attack_power / 100
+    if q <= 0 or q >= 1 or confirmation_blocks <= 0:
+        result = summarize(simulate_races(attack_power, confirmation_blocks, runs), runs, confidence)
+        # Certain outcome: no error for a sure success, undefined for a sure failure
+        result["relative_error"] = 0.0 if result["success_rate"] else None
+        return result
+
+    if confirmation_tilt is None:
+        confirmation_tilt = max(attack_power, 50)
+    if race_tilt is None:
+        race_tilt = max(attack_power, 100 - attack_power)
+    if not (0 < confirmation_tilt < 100 and 0 < race_tilt < 100):
+        raise ValueError("tilted attack powers must be strictly between 0 and 100")
+
+    rng = np.random.default_rng(rng)
+    total = 0.0
+    total_squares = 0.0
+    remaining = runs
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        chunk_total, chunk_squares = _weighted_races(attack_power, confirmation_blocks, n, rng,
+                                                     confirmation_tilt, race_tilt,
+                                                     max_deficit, max_steps)
+        total += chunk_total
+        total_squares += chunk_squares
+        remaining -= n
+
+    estimate = total / runs
+    variance = max(total_squares / runs - estimate * estimate, 0.0) * runs / (runs - 1)
+    standard_error = math.sqrt(variance / runs)
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * standard_error
+    return {
+        "success_rate": estimate,
+        "standard_error": standard_error,
+        "ci_low": max(0.0, estimate - half_width),
+        "ci_high": min(1.0, estimate + half_width),
+        "confidence": confidence,
+        "runs": runs,
+        # None rather than inf when nothing succeeded, so results stay valid JSON
+        "relative_error": standard_error / estimate if estimate else None,
+    }
 
-    for _ in range(runs):
-        honest_power = 100 - attack_power
-        success_probability = (attack_power / honest_power) ** confirmation_blocks
-        
-        if np.random.rand() < success_probability:
-            success_count += 1
 
-    return success_count / runs
\ No newline at end of file
+def monte_carlo_simulation(attack_power, confirmation_blocks, runs, rng=None):
+    return batched_monte_carlo(attack_power, confirmation_blocks, runs, rng=rng)["success_rate"]
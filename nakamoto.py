@@ -1,6 +1,170 @@
 # nakamoto.py
 
+import functools
+import logging
+import math
+import os
+
+import numpy as np
+
+MODELS = ("whitepaper", "rosenfeld")
+
+# Precomputed probability grids are persisted here so they survive restarts.
+TABLE_DIR = os.getenv("NAKAMOTO_TABLE_DIR", os.path.join(".cache", "nakamoto"))
+DEFAULT_STEP = 1.0
+DEFAULT_MAX_CONFIRMATIONS = 50
+
+# Tail terms smaller than the largest term by this many nats are dropped.
+_LOG_EPSILON = 50.0
+
+
+def _log_sum_exp(log_terms):
+    if not log_terms:
+        return -math.inf
+    peak = max(log_terms)
+    if peak == -math.inf:
+        return peak
+    return peak + math.log(sum(math.exp(t - peak) for t in log_terms))
+
+
+def _shares(attack_power):
+    q = attack_power / 100
+    return q, 1 - q
+
+
+def whitepaper_probability(attack_power, confirmation_blocks):
+    """Attacker success probability from section 11 of the Bitcoin whitepaper.
+
+    The attacker's progress while the merchant waits for z blocks is taken to be
+    Poisson with mean z*q/p; from z-k blocks behind the attacker catches up with
+    probability (q/p)^(z-k). Every term is summed in log-space, and the
+    expression is rearranged so that no subtraction from 1 is needed, which
+    keeps tiny probabilities accurate.
+    """
+    q, p = _shares(attack_power)
+    z = int(confirmation_blocks)
+    if z <= 0 or q >= p:
+        return 1.0
+    if q <= 0:
+        return 0.0
+
+    lam = z * q / p
+    log_lam = math.log(lam)
+    log_ratio = math.log(q / p)
+
+    def log_poisson(k):
+        return k * log_lam - lam - math.lgamma(k + 1)
+
+    # Still behind after z blocks: Poisson(k) * (q/p)^(z-k).
+    log_terms = [log_poisson(k) + (z - k) * log_ratio for k in range(z)]
+    # Already caught up: the whole Poisson tail from k = z.
+    k = z
+    while True:
+        term = log_poisson(k)
+        log_terms.append(term)
+        if k > lam and term < max(log_terms) - _LOG_EPSILON:
+            break
+        k += 1
+    return min(math.exp(_log_sum_exp(log_terms)), 1.0)
+
+
+def rosenfeld_probability(attack_power, confirmation_blocks):
+    """Attacker success probability using Rosenfeld's negative binomial model.
+
+    While the honest network mines z blocks the attacker mines m blocks with
+    probability C(m+z-1, m) p^z q^m; from z-m blocks behind it catches up with
+    probability (q/p)^(z-m). Summed in log-space like `whitepaper_probability`.
+    """
+    q, p = _shares(attack_power)
+    z = int(confirmation_blocks)
+    if z <= 0 or q >= p:
+        return 1.0
+    if q <= 0:
+        return 0.0
+
+    log_p, log_q = math.log(p), math.log(q)
+    log_ratio = log_q - log_p
+
+    def log_negative_binomial(m):
+        return (math.lgamma(m + z) - math.lgamma(m + 1) - math.lgamma(z)
+                + z * log_p + m * log_q)
+
+    log_terms = [log_negative_binomial(m) + (z - m) * log_ratio for m in range(z)]
+    m = z
+    while True:
+        term = log_negative_binomial(m)
+        log_terms.append(term)
+        if term < max(log_terms) - _LOG_EPSILON:
+            break
+        m += 1
+    return min(math.exp(_log_sum_exp(log_terms)), 1.0)
+
+
+_MODEL_FUNCTIONS = {
+    "whitepaper": whitepaper_probability,
+    "rosenfeld": rosenfeld_probability,
+}
+
+
+def _table_path(model, step, max_confirmations):
+    return os.path.join(TABLE_DIR, f"{model}_step{step:g}_z{max_confirmations}.npz")
+
+
+def _compute_table(model, step, max_confirmations):
+    probability = _MODEL_FUNCTIONS[model]
+    powers = np.linspace(0, 100, int(round(100 / step)) + 1)
+    table = np.empty((powers.size, max_confirmations + 1))
+    for i, attack_power in enumerate(powers):
+        for z in range(max_confirmations + 1):
+            table[i, z] = probability(attack_power, z)
+    return powers, table
+
+
+@functools.lru_cache(maxsize=None)
+def probability_table(model="whitepaper", step=DEFAULT_STEP,
+                      max_confirmations=DEFAULT_MAX_CONFIRMATIONS):
+    """Grid of success probabilities over attack power 0-100 (in `step` increments)
+    and 0..`max_confirmations` confirmations.
+
+    Returns `(attack_powers, table)` where `table[i, z]` is the probability for
+    `attack_powers[i]` and `z` confirmations. Tables are cached in-process and
+    persisted under `TABLE_DIR`; the returned arrays are read-only.
+    """
+    if model not in _MODEL_FUNCTIONS:
+        raise ValueError(f"Unknown model {model!r}, expected one of {MODELS}")
+    if step <= 0 or 100 / step != round(100 / step):
+        raise ValueError("step must evenly divide 100")
+
+    path = _table_path(model, step, max_confirmations)
+    try:
+        with np.load(path) as cached:
+            powers, table = cached["attack_powers"], cached["table"]
+    except (OSError, KeyError, ValueError):
+        powers, table = _compute_table(model, step, max_confirmations)
+        try:
+            os.makedirs(TABLE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, attack_powers=powers, table=table)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not persist probability table to {path}: {e}")
+
+    powers.flags.writeable = False
+    table.flags.writeable = False
+    return powers, table
+
+
+def lookup_probability(attack_power, confirmation_blocks, model="whitepaper",
+                       step=DEFAULT_STEP, max_confirmations=DEFAULT_MAX_CONFIRMATIONS):
+    """Table lookup for grid points, falling back to the exact formula otherwise."""
+    z = int(confirmation_blocks)
+    index = attack_power / step
+    if 0 <= z <= max_confirmations and 0 <= attack_power <= 100 and index == round(index):
+        _, table = probability_table(model, step, max_confirmations)
+        return float(table[int(round(index)), z])
+    return _MODEL_FUNCTIONS[model](attack_power, z)
+
+
 def nakamoto_success_probability(attack_power, confirmation_blocks):
-    honest_power = 100 - attack_power
-    success_probability = (attack_power / honest_power) ** confirmation_blocks
-    return min(success_probability, 1.0)  # Cap at 1.0
\ No newline at end of file
+    return lookup_probability(attack_power, confirmation_blocks, model="whitepaper")
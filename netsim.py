@@ -0,0 +1,345 @@
+# netsim.py
+
+import heapq
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from blockchain import Blockchain, Transaction
+from miner import MAX_TARGET
+from nakamoto import rosenfeld_probability
+
+# Event kinds, ordered so that deliveries at the same instant run before mining
+_DELIVER = 0
+_MINE = 1
+
+
+class Node:
+    """A network participant holding its own Blockchain.
+
+    Blocks are shared between nodes by reference; each node only tracks which
+    of them it has seen and which are waiting for a missing parent.
+    """
+
+    def __init__(self, node_id: int, blockchain: Blockchain, tip: int):
+        self.node_id = node_id
+        self.name = f"node-{node_id}"
+        self.blockchain = blockchain
+        self.tip = tip
+        self.known = bytearray()
+        self.orphans: Dict[int, List[int]] = {}
+
+    def knows(self, seq: int) -> bool:
+        return seq < len(self.known) and self.known[seq]
+
+    def learn(self, seq: int):
+        if seq >= len(self.known):
+            self.known.extend(bytes(max(seq + 1 - len(self.known), len(self.known))))
+        self.known[seq] = 1
+
+
+class NetworkSimulator:
+    """Discrete-event simulation of honest nodes and one double-spending attacker.
+
+    Block discovery is a Poisson process with mean `block_interval` seconds;
+    each block goes to a miner in proportion to hash power and extends that
+    miner's tip. Blocks reach every other node after an exponential delay with
+    mean `latency` seconds, and nodes follow the most-work chain (first seen
+    wins ties), reorganizing their Blockchain when a heavier branch arrives.
+
+    The attacker repeatedly double-spends: when an attack starts it pays the
+    merchant (node 0) on the public chain and pays itself on a private branch.
+    It publishes the branch once the payment has `confirmations` blocks on the
+    public chain and the branch has more work, and gives up when it falls
+    `max_deficit` blocks behind. An attack succeeds when the merchant reorganizes
+    onto the attacker's branch. Ties go to the first-seen chain, so the
+    attacker has to get strictly ahead and the success rate runs below the
+    Rosenfeld probability, which counts catching up as success.
+    """
+
+    def __init__(self, n_honest: int = 100, attack_power: float = 30.0, confirmations: int = 6,
+                 block_interval: float = 600.0, latency: float = 2.0, max_deficit: int = 20,
+                 honest_powers: Optional[List[float]] = None, difficulty_bits: float = 0, seed=None):
+        if n_honest < 1:
+            raise ValueError("n_honest must be at least 1")
+        if not 0 <= attack_power < 100:
+            raise ValueError("attack_power must be between 0 and 100")
+        self.rng = np.random.default_rng(seed)
+        self.confirmations = confirmations
+        self.block_interval = block_interval
+        self.latency = latency
+        self.max_deficit = max_deficit
+        self.attack_power = attack_power
+
+        # Simulated mining does no hashing, so the default zero-bit target
+        # accepts proof 0 and blocks still pass Blockchain.append_block checks.
+        self.difficulty_bits = difficulty_bits
+        founder = Blockchain(difficulty_bits=difficulty_bits)
+        genesis = founder.chain[0]
+
+        # Shared per-block metadata, indexed by block sequence number
+        self.blocks = [genesis]
+        self.parent = [-1]
+        self.height = [1]
+        self.work = [MAX_TARGET // founder.target]
+
+        self.nodes = [Node(i, founder if i == 0 else Blockchain(difficulty_bits=difficulty_bits, genesis=genesis), 0)
+                      for i in range(n_honest)]
+        self.attacker = Node(n_honest, Blockchain(difficulty_bits=difficulty_bits, genesis=genesis), 0) if attack_power > 0 else None
+        if self.attacker is not None:
+            self.attacker.name = "attacker"
+        self.merchant = self.nodes[0]
+        for node in self.participants:
+            node.learn(0)
+
+        powers = np.asarray(honest_powers if honest_powers is not None else np.ones(n_honest), dtype=float)
+        if len(powers) != n_honest:
+            raise ValueError("honest_powers must have one entry per honest node")
+        powers = powers / powers.sum() * (100 - attack_power)
+        if self.attacker is not None:
+            powers = np.append(powers, attack_power)
+        self.cumulative_power = np.cumsum(powers / powers.sum())
+
+        self.now = 0.0
+        self._events = []
+        self._counter = 0
+        self.events_processed = 0
+        self.reorgs = 0
+        self.max_reorg_depth = 0
+        self.blocks_by_attacker = 0
+
+        # Attack state
+        self.private = False
+        self.public_tip = 0
+        self.fork_height = 1
+        self.payment: Optional[Transaction] = None
+        self.payment_blocks: List[int] = []
+        self.released_tip: Optional[int] = None
+        self.attacks = 0
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def participants(self) -> List[Node]:
+        return self.nodes + ([self.attacker] if self.attacker is not None else [])
+
+    def _schedule(self, at: float, kind: int, node: int = -1, seq: int = -1):
+        self._counter += 1
+        heapq.heappush(self._events, (at, kind, self._counter, node, seq))
+
+    def _broadcast(self, seq: int, sender: Node, at: float):
+        delays = self.rng.exponential(self.latency, len(self.participants)) if self.latency > 0 else np.zeros(len(self.participants))
+        for node, delay in zip(self.participants, delays.tolist()):
+            if node is not sender:
+                self._schedule(at + delay, _DELIVER, node.node_id, seq)
+
+    def _register(self, block, parent: int) -> int:
+        seq = len(self.blocks)
+        self.blocks.append(block)
+        self.parent.append(parent)
+        self.height.append(self.height[parent] + 1)
+        self.work.append(self.work[parent] + MAX_TARGET // int(block.target, 16))
+        return seq
+
+    def _on_chain(self, node: Node, seq: int) -> bool:
+        position = self.height[seq] - 1
+        chain = node.blockchain.chain
+        return position < len(chain) and chain[position] is self.blocks[seq]
+
+    def _switch_to(self, node: Node, seq: int):
+        """Make `seq` the node's tip, appending or reorganizing its Blockchain"""
+        if self.parent[seq] == node.tip:
+            node.blockchain.append_block(self.blocks[seq])
+        else:
+            branch = []
+            ancestor = seq
+            while not self._on_chain(node, ancestor):
+                branch.append(ancestor)
+                ancestor = self.parent[ancestor]
+            orphaned = node.blockchain.reorganize(self.height[ancestor], [self.blocks[s] for s in reversed(branch)])
+            self.reorgs += 1
+            self.max_reorg_depth = max(self.max_reorg_depth, len(orphaned))
+        node.tip = seq
+        if node is self.merchant:
+            self._check_release()
+
+    def _receive(self, node: Node, seq: int):
+        if node.knows(seq):
+            return
+        parent = self.parent[seq]
+        if not node.knows(parent):
+            node.orphans.setdefault(parent, []).append(seq)
+            return
+        pending = [seq]
+        while pending:
+            seq = pending.pop()
+            node.learn(seq)
+            if node is self.attacker and self.private:
+                # A private attacker watches the public chain without following it
+                if self.work[seq] > self.work[self.public_tip]:
+                    self.public_tip = seq
+                    self._check_attack()
+            elif self.work[seq] > self.work[node.tip]:
+                self._switch_to(node, seq)
+            pending.extend(node.orphans.pop(seq, ()))
+
+    def _mine(self):
+        winner = int(np.searchsorted(self.cumulative_power, self.rng.random(), side="right"))
+        node = self.participants[min(winner, len(self.participants) - 1)]
+        parent = node.tip
+        block = node.blockchain.new_block(0, miner=node.name)
+        seq = self._register(block, parent)
+        node.learn(seq)
+        node.tip = seq
+        if node is self.attacker:
+            self.blocks_by_attacker += 1
+            if self.private:
+                self._check_attack()
+            else:
+                self._broadcast(seq, node, self.now)
+        else:
+            if self.payment is not None and any(tx.id == self.payment.id for tx in block.transactions):
+                self.payment_blocks.append(seq)
+            if node is self.merchant:
+                self._check_release()
+            self._broadcast(seq, node, self.now)
+        self._schedule(self.now + self.rng.exponential(self.block_interval), _MINE)
+
+    def _start_attack(self):
+        attacker = self.attacker
+        self.attacks += 1
+        self.private = True
+        self.public_tip = attacker.tip
+        self.fork_height = self.height[attacker.tip]
+        self.released_tip = None
+        # The payment to the merchant and the payment back to the attacker spend
+        # the same funds, modelled by giving them the same id: a reorganization
+        # that confirms one never returns the other to the mempool.
+        tx_id = f"attack-{self.attacks}"
+        self.payment = Transaction("attacker", "merchant", 1.0, id=tx_id)
+        self.payment_blocks = []
+        for node in self.nodes:
+            node.blockchain.mempool.add(self.payment)
+        attacker.blockchain.mempool.add(Transaction("attacker", "attacker", 1.0, id=tx_id))
+
+    def _payment_confirmations(self, tip: int) -> int:
+        for seq in self.payment_blocks:
+            ancestor = tip
+            while self.height[ancestor] > self.height[seq]:
+                ancestor = self.parent[ancestor]
+            if ancestor == seq:
+                return self.height[tip] - self.height[seq] + 1
+        return 0
+
+    def _check_attack(self):
+        attacker = self.attacker
+        public, private = self.public_tip, attacker.tip
+        if self._payment_confirmations(public) >= self.confirmations and self.work[private] > self.work[public]:
+            # Publish the private branch and resume following the network
+            branch = []
+            seq = private
+            while self.height[seq] > self.fork_height:
+                branch.append(seq)
+                seq = self.parent[seq]
+            for seq in reversed(branch):
+                self._broadcast(seq, attacker, self.now)
+            self.private = False
+            self.released_tip = private
+        elif self.height[public] - self.height[private] >= self.max_deficit:
+            self._resolve(False)
+
+    def _check_release(self):
+        if self.released_tip is None:
+            return
+        if self._on_chain(self.merchant, self.released_tip):
+            self._resolve(True)
+        elif self.work[self.merchant.tip] > self.work[self.released_tip]:
+            self._resolve(False)
+
+    def _resolve(self, success: bool):
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+            if self.private:
+                # Give up: drop the private branch and follow the public chain
+                self.private = False
+                if self.work[self.public_tip] > self.work[self.attacker.tip]:
+                    self._switch_to(self.attacker, self.public_tip)
+        self.released_tip = None
+        self._start_attack()
+
+    def run(self, blocks: int = 10_000) -> Dict:
+        """Simulate until `blocks` blocks have been mined and delivered everywhere"""
+        started = time.perf_counter()
+        if self.attacker is not None and not self.private and self.released_tip is None:
+            self._start_attack()
+        target = len(self.blocks) - 1 + blocks
+        self._schedule(self.now + self.rng.exponential(self.block_interval), _MINE)
+        nodes = self.participants
+        while self._events:
+            at, kind, _, node, seq = heapq.heappop(self._events)
+            self.now = at
+            self.events_processed += 1
+            if kind == _DELIVER:
+                self._receive(nodes[node], seq)
+            elif len(self.blocks) - 1 < target:
+                self._mine()
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float = 0.0) -> Dict:
+        best = max(range(len(self.blocks)), key=self.work.__getitem__)
+        mined = len(self.blocks) - 1
+        resolved = self.successes + self.failures
+        report = {
+            "nodes": len(self.nodes),
+            "blocks_mined": mined,
+            "best_height": self.height[best],
+            "stale_blocks": mined + 1 - self.height[best],
+            "stale_rate": (mined + 1 - self.height[best]) / mined if mined else 0.0,
+            "consensus": sum(node.tip == best for node in self.nodes) / len(self.nodes),
+            "reorgs": self.reorgs,
+            "max_reorg_depth": self.max_reorg_depth,
+            "simulated_seconds": self.now,
+            "events": self.events_processed,
+            "elapsed": elapsed,
+            "events_per_sec": self.events_processed / elapsed if elapsed > 0 else 0.0,
+        }
+        if self.attacker is not None:
+            report.update({
+                "attack_power": self.attack_power,
+                "confirmations": self.confirmations,
+                "attacker_blocks": self.blocks_by_attacker,
+                "attacks": resolved,
+                "successes": self.successes,
+                "success_rate": self.successes / resolved if resolved else 0.0,
+                "rosenfeld_probability": rosenfeld_probability(self.attack_power, self.confirmations),
+            })
+        return report
+
+
+def simulate_network(n_honest=100, attack_power=30.0, confirmations=6, blocks=10_000, block_interval=600.0,
+                     latency=2.0, max_deficit=20, seed=None):
+    """Run a NetworkSimulator for `blocks` blocks and return its report."""
+    return NetworkSimulator(n_honest, attack_power, confirmations, block_interval, latency, max_deficit,
+                            seed=seed).run(blocks)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Simulate a network of nodes under a double-spend attack")
+    parser.add_argument("--nodes", type=int, default=100, help="honest nodes")
+    parser.add_argument("--attack-power", type=float, default=30.0, help="attacker hash power in percent")
+    parser.add_argument("--confirmations", type=int, default=6)
+    parser.add_argument("--blocks", type=int, default=10_000)
+    parser.add_argument("--block-interval", type=float, default=600.0, help="mean seconds between blocks")
+    parser.add_argument("--latency", type=float, default=2.0, help="mean propagation delay in seconds")
+    parser.add_argument("--max-deficit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(simulate_network(args.nodes, args.attack_power, args.confirmations, args.blocks,
+                                      args.block_interval, args.latency, args.max_deficit, args.seed), indent=2))
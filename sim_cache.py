@@ -0,0 +1,205 @@
+"""
+Simulation Result Cache
+In-process LRU + TTL cache with an optional SQLite backend shared between workers
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SimulationCache:
+    """LRU + TTL cache for simulation results keyed on normalized request parameters"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        """Open (or create) the SQLite store shared by all worker processes"""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            logging.info(f"Simulation cache using SQLite store at {path}")
+        except sqlite3.Error as e:
+            logging.error(f"Failed to open simulation cache store {path}: {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(namespace: str, params: Dict[str, Any]) -> str:
+        """Build a cache key that is identical for equivalent requests"""
+        normalized = {}
+        for name, value in params.items():
+            if value is None:
+                continue
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            elif isinstance(value, float):
+                value = float(f"{value:.12g}")
+            elif isinstance(value, str):
+                value = value.strip().lower()
+            normalized[name] = value
+        return f"{namespace}:{json.dumps(normalized, sort_keys=True, separators=(',', ':'))}"
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value), checking memory first and then the shared store"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?", (key, now)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"Simulation cache read error: {e}")
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, value, row[1])
+                    self.disk_hits += 1
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value in memory and in the shared store"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), expires_at),
+                    )
+            except sqlite3.Error as e:
+                logging.error(f"Simulation cache write error: {e}")
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, namespace: str, params: Dict[str, Any], compute: Callable[[], Any],
+                       bypass: bool = False) -> Any:
+        """
+        Return the cached result for `params`, computing and storing it on a miss
+
+        Args:
+            namespace: Entry point the parameters belong to (e.g. 'simulate')
+            params: Request parameters identifying the result
+            compute: Called with no arguments to produce the result on a miss
+            bypass: Skip the lookup and always recompute (the fresh result is still stored)
+        """
+        key = self.make_key(namespace, params)
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+        else:
+            found, value = self.get(key)
+            if found:
+                return value
+
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from memory and the shared store"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        removed = len(expired)
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    removed += self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,)).rowcount
+            except sqlite3.Error as e:
+                logging.error(f"Simulation cache purge error: {e}")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM results")
+            except sqlite3.Error as e:
+                logging.error(f"Simulation cache clear error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus entry counts"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats = {
+                'pid': os.getpid(),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'backend': 'sqlite' if self._db is not None else 'memory',
+            }
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    stats['disk_entries'] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            except sqlite3.Error:
+                stats['disk_entries'] = None
+        return stats
+
+
+# Global instance
+simulation_cache = SimulationCache(
+    max_entries=int(os.getenv('SIM_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('SIM_CACHE_TTL', 3600)),
+    path=os.getenv('SIM_CACHE_PATH') or None,
+)
@@ -0,0 +1,187 @@
+"""
+Storage Codecs
+Pluggable serialization formats for cloud storage uploads, with streaming encode/decode
+"""
+
+import io
+import gzip
+import json
+import logging
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+# Optional codecs
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+class Codec:
+    """A named serialization format"""
+
+    def __init__(self, name: str, suffix: str, content_type: str,
+                 encode: Callable[[Any, BinaryIO], None], decode: Callable[[BinaryIO], Any],
+                 magic: bytes = b'', available: bool = True):
+        self.name = name
+        self.suffix = suffix
+        self.content_type = content_type
+        self.encode = encode
+        self.decode = decode
+        self.magic = magic
+        self.available = available
+
+
+def _write_json(data: Any, stream: BinaryIO):
+    # iterencode yields the document piece by piece, so the full JSON text is
+    # never held in memory alongside the data.
+    writer = io.TextIOWrapper(stream, encoding='utf-8')
+    for chunk in _JSON_ENCODER.iterencode(data):
+        writer.write(chunk)
+    writer.flush()
+    writer.detach()
+
+
+def _read_json(stream: BinaryIO) -> Any:
+    # The standard library has no incremental JSON parser, so decoding holds
+    # the decompressed text and the decoded value at the same time; the
+    # msgpack codec decodes without the intermediate copy.
+    return json.loads(stream.read())
+
+
+def _encode_gzip(data: Any, stream: BinaryIO):
+    # mtime=0 keeps the output identical for identical data
+    with gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=6, mtime=0) as compressed:
+        _write_json(data, compressed)
+
+
+def _decode_gzip(stream: BinaryIO) -> Any:
+    with gzip.GzipFile(fileobj=stream, mode='rb') as compressed:
+        return _read_json(compressed)
+
+
+def _encode_zstd(data: Any, stream: BinaryIO):
+    with zstandard.ZstdCompressor(level=3).stream_writer(stream, closefd=False) as compressed:
+        _write_json(data, compressed)
+
+
+def _decode_zstd(stream: BinaryIO) -> Any:
+    with zstandard.ZstdDecompressor().stream_reader(stream, closefd=False) as compressed:
+        return _read_json(compressed)
+
+
+# Containers this many levels deep are packed whole; above that the encoder
+# writes a header and then each item, so a snapshot segment is never packed
+# into one buffer.
+MSGPACK_STREAM_DEPTH = 2
+
+
+def _pack_into(packer, data: Any, stream: BinaryIO, depth: int):
+    if depth > 0 and isinstance(data, dict):
+        stream.write(packer.pack_map_header(len(data)))
+        for key, value in data.items():
+            stream.write(packer.pack(key))
+            _pack_into(packer, value, stream, depth - 1)
+    elif depth > 0 and isinstance(data, (list, tuple)):
+        stream.write(packer.pack_array_header(len(data)))
+        for item in data:
+            _pack_into(packer, item, stream, depth - 1)
+    else:
+        stream.write(packer.pack(data))
+
+
+def _encode_msgpack(data: Any, stream: BinaryIO):
+    # Produces the same bytes as packing `data` in one call
+    _pack_into(msgpack.Packer(use_bin_type=True), data, stream, MSGPACK_STREAM_DEPTH)
+
+
+def _decode_msgpack(stream: BinaryIO) -> Any:
+    # The unpacker reads the stream incrementally; max_buffer_size=0 lifts the
+    # default 100 MiB cap so large chain snapshots decode
+    return msgpack.Unpacker(stream, raw=False, strict_map_key=False, max_buffer_size=0).unpack()
+
+
+CODECS: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    """Make a codec available by name for uploads and detection"""
+    CODECS[codec.name] = codec
+
+
+register_codec(Codec('json', '.json', 'application/json', _write_json, _read_json))
+register_codec(Codec('json+gzip', '.json.gz', 'application/gzip', _encode_gzip, _decode_gzip,
+                     magic=GZIP_MAGIC))
+register_codec(Codec('json+zstd', '.json.zst', 'application/zstd', _encode_zstd, _decode_zstd,
+                     magic=ZSTD_MAGIC, available=ZSTD_AVAILABLE))
+register_codec(Codec('msgpack', '.msgpack', 'application/msgpack', _encode_msgpack, _decode_msgpack,
+                     available=MSGPACK_AVAILABLE))
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Look up a codec by name
+
+    Raises:
+        ValueError: If the codec is unknown or its library is not installed
+    """
+    codec = CODECS.get(name.lower())
+    if codec is None:
+        raise ValueError(f"Unknown storage codec: {name}")
+    if not codec.available:
+        raise ValueError(f"Storage codec {name} needs a library that is not installed")
+    return codec
+
+
+def detect_codec(head: bytes, filename: str = '') -> Codec:
+    """
+    Pick the codec for stored content
+
+    Magic bytes are checked first, then the file suffix; content that starts
+    like a JSON document is JSON, and anything else is tried as msgpack.
+
+    Args:
+        head: The first few bytes of the content
+        filename: Object name, used for its suffix
+    """
+    for codec in CODECS.values():
+        if codec.magic and head.startswith(codec.magic):
+            return codec
+    for codec in sorted(CODECS.values(), key=lambda c: len(c.suffix), reverse=True):
+        if codec.suffix and filename.endswith(codec.suffix) and not codec.magic:
+            return codec
+    stripped = head.lstrip()
+    if not stripped or stripped[:1] in b'{["-0123456789tfn':
+        return CODECS['json']
+    if CODECS['msgpack'].available:
+        return CODECS['msgpack']
+    logging.warning(f"Could not detect the format of {filename or 'content'}; trying JSON")
+    return CODECS['json']
+
+
+def decode_stream(stream: BinaryIO, filename: str = '', codec: Optional[str] = None) -> Any:
+    """
+    Decode stored content from a seekable binary stream
+
+    Args:
+        stream: Stream positioned at the start of the content
+        filename: Object name, used for suffix-based detection
+        codec: Codec name to use instead of detection
+    """
+    if codec is not None:
+        return get_codec(codec).decode(stream)
+    start = stream.tell()
+    head = stream.read(16)
+    stream.seek(start)
+    return detect_codec(head, filename).decode(stream)
@@ -0,0 +1,85 @@
+# sweep.py
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from monte import DEFAULT_MAX_RUNS, batched_monte_carlo
+
+# Largest number of values one sweep axis may expand to
+MAX_AXIS_POINTS = 1000
+# Largest total number of simulated races (grid cells x runs) per sweep
+MAX_SWEEP_RACES = 10 * DEFAULT_MAX_RUNS
+
+
+def expand_range(spec, max_points=MAX_AXIS_POINTS):
+    """Turn a sweep axis into a list of values.
+
+    Accepts a single number, a list of values, or a dict with `start`, `stop`
+    (inclusive) and optional `step` (default 1). The number of values is
+    checked against `max_points` before any list is built.
+    """
+    if isinstance(spec, dict):
+        start, stop, step = spec["start"], spec["stop"], spec.get("step", 1)
+        if not all(np.isfinite([start, stop, step])):
+            raise ValueError("start, stop and step must be finite")
+        if step <= 0:
+            raise ValueError("step must be positive")
+        count = max(int(np.floor((stop - start) / step + 1e-9)) + 1, 0)
+        if count > max_points:
+            raise ValueError(f"axis has {count} points; at most {max_points} are allowed")
+        return [start + i * step for i in range(count)]
+    if isinstance(spec, (list, tuple)):
+        if len(spec) > max_points:
+            raise ValueError(f"axis has {len(spec)} points; at most {max_points} are allowed")
+        return list(spec)
+    return [spec]
+
+
+def _sweep_row(row, attack_power, confirmations, runs, seed_sequence):
+    # Each row gets its own spawned stream, so results do not depend on how
+    # rows are scheduled across workers.
+    rng = np.random.default_rng(seed_sequence)
+    return row, [batched_monte_carlo(attack_power, z, runs, rng=rng) for z in confirmations]
+
+
+def iter_sweep(attack_powers, confirmations, runs, seed=None, max_workers=None):
+    """Run a Monte Carlo sweep over attack power x confirmations in worker processes.
+
+    Yields `(row, attack_power, results)` as each attack-power row finishes, in
+    completion order; `results[j]` is the `batched_monte_carlo` summary for
+    `confirmations[j]`. With the same `seed` the results are reproducible
+    regardless of `max_workers`.
+    """
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(attack_powers))
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [
+            pool.submit(_sweep_row, row, attack_power, confirmations, runs, seed_sequences[row])
+            for row, attack_power in enumerate(attack_powers)
+        ]
+        for future in as_completed(futures):
+            row, results = future.result()
+            yield row, attack_powers[row], results
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def parameter_sweep(attack_powers, confirmations, runs, seed=None, max_workers=None):
+    """Collect `iter_sweep` into success-rate and standard-error matrices."""
+    attack_powers = expand_range(attack_powers)
+    confirmations = [int(z) for z in expand_range(confirmations)]
+    success_rate = np.empty((len(attack_powers), len(confirmations)))
+    standard_error = np.empty_like(success_rate)
+
+    for row, _, results in iter_sweep(attack_powers, confirmations, runs, seed, max_workers):
+        success_rate[row] = [r["success_rate"] for r in results]
+        standard_error[row] = [r["standard_error"] for r in results]
+
+    return {
+        "attack_powers": attack_powers,
+        "confirmations": confirmations,
+        "runs": runs,
+        "success_rate": success_rate,
+        "standard_error": standard_error,
+    }